@@ -1,60 +1,67 @@
 import pandas as pd
-import re
+
+from cleaning_engine import obtener_motor, cerrar_motor, motor_desde_argv
+from etl_profiler import activar_desde_argv, iniciar_etapa, finalizar
+from format_detection import detectar_formato
+
+# --profile[=directorio]: flamegraph por etapa
+activar_desde_argv()
 
 # --- Rutas ---
 ruta_archivo = r"C:\Users\luste\Downloads\drive-download-20250926T023828Z-1-001\Insumos Solicitados Histórico Actualizado.csv"
 ruta_salida = r"C:\Users\luste\Downloads\Insumos Solicitados Histórico Actualizado Limpio.csv"
 
-# --- Detectar delimitador ---
-def detectar_delimitador(ruta):
-    with open(ruta, 'r', encoding='latin1', errors='ignore') as f:
-        primera_linea = f.readline()
-    posibles = [',', ';', '\t', '|']
-    conteos = {sep: primera_linea.count(sep) for sep in posibles}
-    delimitador = max(conteos, key=conteos.get)
-    print(f"🕵️ Delimitador detectado: '{delimitador}'")
-    return delimitador
-
-sep_detectado = detectar_delimitador(ruta_archivo)
+# --- Detectar delimitador y encoding ---
+iniciar_etapa('detectar_formato')
+sep_detectado, encoding_detectado = detectar_formato(ruta_archivo)
+print(f"🕵️ Delimitador detectado: '{sep_detectado}' (encoding: {encoding_detectado})")
 
 # --- Leer CSV ---
-# Se usa utf-8-sig para eliminar automáticamente el BOM (ï»¿)
-insumos = pd.read_csv(
+iniciar_etapa('leer_csv')
+# Si el archivo trae BOM (ï»¿) se detecta como utf-8-sig y se descarta al leer
+# Motor: pandas por defecto; --engine duckdb|polars para archivos grandes
+motor = obtener_motor(motor_desde_argv())
+insumos = motor.leer_csv(
     ruta_archivo,
-    sep=sep_detectado,
-    encoding='utf-8-sig',
-    on_bad_lines='skip'
+    sep_detectado,
+    encoding_detectado,
+    omitir_lineas_malas=True
 )
+registros_originales = motor.contar(insumos)
 
 # --- Limpieza general ---
+iniciar_etapa('limpieza_general')
 # Normalizar nombres de columnas
-insumos.columns = (
-    insumos.columns
+columnas = motor.columnas(insumos)
+columnas_limpias = (
+    pd.Index(columnas)
     .str.replace(r'[\ufeff\u200b]', '', regex=True)  # elimina BOM y caracteres invisibles
     .str.strip()
 )
+insumos = motor.renombrar(insumos, dict(zip(columnas, columnas_limpias)))
 
-# Quitar espacios en celdas tipo texto
-for col in insumos.select_dtypes(include='object').columns:
-    insumos[col] = insumos[col].astype(str).str.strip()
+# Quitar espacios en celdas tipo texto (todas las columnas se leen como texto)
+insumos = motor.recortar(insumos, list(columnas_limpias))
 
 # --- Eliminar registros tipo DEMO ---
 columna_id = 'Identificacion Paciente'
-if columna_id not in insumos.columns:
-    print(f"❌ No se encontró la columna '{columna_id}'. Columnas detectadas: {insumos.columns.tolist()}")
+if columna_id not in columnas_limpias:
+    print(f"❌ No se encontró la columna '{columna_id}'. Columnas detectadas: {list(columnas_limpias)}")
     exit()
 
-# Convertir a string y eliminar registros con 'demo' en cualquier forma
-insumos[columna_id] = insumos[columna_id].astype(str).str.strip()
-mascara_demo = insumos[columna_id].str.contains(r'demo', flags=re.IGNORECASE, na=False)
-insumos_limpio = insumos[~mascara_demo]
+# Eliminar registros con 'demo' en cualquier forma
+insumos_limpio = motor.filtrar_demo(insumos, columna_id)
 
 # --- Guardar el nuevo archivo limpio (sin cambiar ruta) ---
-insumos_limpio.to_csv(ruta_salida, index=False, encoding='utf-8-sig', sep=sep_detectado)
+iniciar_etapa('escribir_csv')
+motor.escribir_csv(insumos_limpio, ruta_salida, sep=sep_detectado)
+registros_finales = motor.contar(insumos_limpio)
+cerrar_motor(motor)
+finalizar()
 
 # --- Resumen ---
-eliminados = mascara_demo.sum()
+eliminados = registros_originales - registros_finales
 print(f"🧹 Registros eliminados con 'DEMO' (en cualquier forma): {eliminados}")
-print(f"✅ Registros finales: {len(insumos_limpio)}")
-print(f"📋 Columnas finales: {list(insumos_limpio.columns)}")
+print(f"✅ Registros finales: {registros_finales}")
+print(f"📋 Columnas finales: {list(columnas_limpias)}")
 print(f"💾 Archivo limpio guardado en:\n{ruta_salida}")
@@ -1,27 +1,16 @@
 import pandas as pd
 import os
 
+from format_detection import detectar_formato
+
 ruta_descargas = r"C:\Users\luste\Downloads"
 ruta_reporte = os.path.join(ruta_descargas, "Reporte Equipos.csv")
 ruta_aseguradoras = r"C:\Users\luste\Downloads\Aseguradora y Capita.csv"
 ruta_salida = os.path.join(ruta_descargas, "Reporte_Equipos_Limpio.csv")
 
-# --- Detectar separador con tolerancia a encoding ---
-def detectar_sep(ruta):
-    import csv
-    for encoding in ['utf-8-sig', 'latin1', 'windows-1252']:
-        try:
-            with open(ruta, 'r', encoding=encoding) as f:
-                primera_linea = f.readline()
-                sniffer = csv.Sniffer()
-                return sniffer.sniff(primera_linea).delimiter, encoding
-        except Exception:
-            continue
-    raise ValueError("No se pudo detectar separador ni codificación del archivo")
-
 # Detectar separador y encoding
-sep_reporte, enc_reporte = detectar_sep(ruta_reporte)
-sep_aseg, enc_aseg = detectar_sep(ruta_aseguradoras)
+sep_reporte, enc_reporte = detectar_formato(ruta_reporte)
+sep_aseg, enc_aseg = detectar_formato(ruta_aseguradoras)
 
 print(f"📄 Reporte Equipos -> separador: '{sep_reporte}', encoding: {enc_reporte}")
 print(f"🏥 Aseguradora y Capita -> separador: '{sep_aseg}', encoding: {enc_aseg}")
@@ -0,0 +1,450 @@
+"""
+Motores de Ejecución para Limpieza
+Autor: Data Team
+Descripción: Abstracción de motor para los pasos de limpieza (filtro DEMO,
+             recorte de texto, cruce con catálogos y mapeo exacto de códigos).
+             pandas es el motor de referencia; DuckDB y Polars (lazy) ejecutan
+             los mismos pasos en paralelo y fuera de memoria.
+
+Todos los motores leen las columnas como texto (sin inferencia de tipos ni
+valores NA por defecto) y escriben con el mismo escritor de pandas, de modo
+que el archivo de salida es idéntico sin importar el motor elegido.
+"""
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+# ===============================================================
+# CONFIGURACIÓN
+# ===============================================================
+# Motor por defecto; se puede cambiar con la variable de entorno MOTOR_LIMPIEZA
+MOTOR_POR_DEFECTO = os.getenv('MOTOR_LIMPIEZA', 'pandas')
+
+# Filas por bloque al escribir la salida de los motores fuera de memoria
+FILAS_POR_BLOQUE = 100_000
+
+# Caracteres que elimina str.strip() de Python (incluye espacios Unicode)
+ESPACIOS = ''.join(chr(i) for i in range(0x3001) if chr(i).isspace())
+
+# ===============================================================
+# FUNCIONES AUXILIARES
+# ===============================================================
+def _ident(nombre):
+    """Cita un identificador SQL"""
+    return '"' + str(nombre).replace('"', '""') + '"'
+
+def _literal(valor):
+    """Cita un literal de texto SQL"""
+    return "'" + str(valor).replace("'", "''") + "'"
+
+def _a_utf8(ruta, encoding):
+    """
+    Transcodifica un archivo a UTF-8 (sin BOM) por bloques, sin cargarlo en memoria
+
+    DuckDB y Polars solo leen UTF-8 de forma nativa.
+
+    Args:
+        ruta (str): Ruta al archivo original
+        encoding (str): Encoding del archivo original
+
+    Returns:
+        str: Ruta al archivo UTF-8 (la original si no hace falta convertir)
+    """
+    if encoding.lower().replace('_', '-') in ('utf-8', 'utf8'):
+        return ruta
+
+    fd, ruta_tmp = tempfile.mkstemp(suffix='.csv', prefix='limpieza_')
+    with open(ruta, 'r', encoding=encoding, newline='') as origen, \
+            os.fdopen(fd, 'w', encoding='utf-8', newline='') as destino:
+        while True:
+            bloque = origen.read(1 << 20)
+            if not bloque:
+                break
+            destino.write(bloque)
+    return ruta_tmp
+
+def _escribir_bloques(bloques, ruta, sep):
+    """
+    Escribe bloques de DataFrames en un único CSV con el formato de referencia
+
+    Args:
+        bloques (iterable): DataFrames de pandas en orden
+        ruta (str): Ruta de salida
+        sep (str): Separador de salida
+    """
+    with open(ruta, 'w', encoding='utf-8-sig', newline='') as f:
+        encabezado = True
+        for bloque in bloques:
+            bloque.to_csv(f, sep=sep, index=False, header=encabezado)
+            encabezado = False
+
+# ===============================================================
+# MOTOR PANDAS (REFERENCIA)
+# ===============================================================
+class MotorPandas:
+    """Motor de referencia: pandas en memoria, un solo hilo"""
+
+    nombre = 'pandas'
+
+    def __init__(self, hilos=None):
+        # pandas usa un solo hilo: `hilos` se acepta por uniformidad
+        pass
+
+    def leer_csv(self, ruta, sep, encoding, omitir_lineas_malas=False):
+        """Lee un CSV con todas las columnas como texto"""
+        return pd.read_csv(
+            ruta,
+            sep=sep,
+            encoding=encoding,
+            dtype=str,
+            keep_default_na=False,
+            on_bad_lines='skip' if omitir_lineas_malas else 'error'
+        )
+
+    def columnas(self, tabla):
+        return list(tabla.columns)
+
+    def renombrar(self, tabla, nombres):
+        return tabla.rename(columns=nombres)
+
+    def contar(self, tabla, nulos_en=None):
+        """Cuenta filas; con `nulos_en` cuenta solo las filas nulas en esa columna"""
+        if nulos_en is None:
+            return len(tabla)
+        return int(tabla[nulos_en].isna().sum())
+
+    def filtrar_demo(self, tabla, columna):
+        """Elimina filas cuya columna contiene 'DEMO' (sin distinguir mayúsculas)"""
+        mascara = tabla[columna].str.contains('DEMO', case=False, na=False, regex=False)
+        return tabla[~mascara]
+
+    def recortar(self, tabla, columnas):
+        tabla = tabla.copy()
+        for col in columnas:
+            tabla[col] = tabla[col].str.strip()
+        return tabla
+
+    def cruzar(self, tabla, catalogo, clave, valor):
+        """Cruce izquierdo con un catálogo (misma semántica que DataFrame.merge)"""
+        return tabla.merge(catalogo[[clave, valor]], on=clave, how='left')
+
+    def mapear(self, tabla, columna, diccionario, destino):
+        """Mapeo exacto columna → diccionario (misma semántica que Series.map)"""
+        tabla = tabla.copy()
+        tabla[destino] = tabla[columna].map(diccionario)
+        return tabla
+
+    def aplicar(self, tabla, columna, funcion, destino):
+        """Aplica una función Python fila a fila sobre una columna de texto"""
+        tabla = tabla.copy()
+        tabla[destino] = tabla[columna].apply(funcion)
+        return tabla
+
+    def reemplazar_con(self, tabla, destino, origen, defecto):
+        """destino = origen (o `defecto` si es nulo) y elimina la columna origen"""
+        tabla = tabla.copy()
+        tabla[destino] = tabla[origen].fillna(defecto)
+        return tabla.drop(columns=[origen])
+
+    def materializar(self, tabla):
+        """Ejecuta los pasos pendientes una sola vez (en pandas ya están ejecutados)"""
+        return tabla
+
+    def a_pandas(self, tabla):
+        return tabla
+
+    def escribir_csv(self, tabla, ruta, sep=','):
+        _escribir_bloques([tabla], ruta, sep)
+
+# ===============================================================
+# MOTOR DUCKDB
+# ===============================================================
+class MotorDuckDB:
+    """Motor DuckDB: multi-hilo y con desborde a disco"""
+
+    nombre = 'duckdb'
+
+    def __init__(self, hilos=None):
+        import duckdb
+        # Por defecto DuckDB usa todos los núcleos; en un pool de procesos
+        # conviene repartirlos (ver limpiar_lote_reportes)
+        self.con = duckdb.connect(config={'threads': hilos} if hilos else {})
+        self._temporales = []
+        self._contador = 0
+
+    def _nuevo_nombre(self, prefijo):
+        self._contador += 1
+        return f"{prefijo}_{self._contador}"
+
+    def leer_csv(self, ruta, sep, encoding, omitir_lineas_malas=False):
+        ruta_utf8 = _a_utf8(ruta, encoding)
+        if ruta_utf8 != ruta:
+            self._temporales.append(ruta_utf8)
+
+        opciones = dict(sep=sep, header=True, quotechar='"', escapechar='"')
+        if omitir_lineas_malas:
+            # Igual que on_bad_lines='skip': columnas fijas según el encabezado,
+            # se descartan las filas con campos de más y se completan las que
+            # tienen de menos. Sin auto_detect el sniffer no agrega columnas
+            # por las filas malas; null_padding con saltos de línea entre
+            # comillas requiere el lector de un solo hilo.
+            encabezado = pd.read_csv(ruta_utf8, sep=sep, encoding='utf-8', dtype=str, nrows=0)
+            opciones.update(
+                auto_detect=False,
+                columns={c: 'VARCHAR' for c in encabezado.columns},
+                ignore_errors=True,
+                null_padding=True,
+                parallel=False
+            )
+        else:
+            opciones.update(all_varchar=True)
+        rel = self.con.read_csv(ruta_utf8, **opciones)
+
+        # pandas (keep_default_na=False) lee los vacíos como '' y no como NULL
+        proyeccion = ', '.join(
+            f"coalesce({_ident(c)}, '') AS {_ident(c)}" for c in rel.columns
+        )
+        return rel.project(proyeccion)
+
+    def columnas(self, tabla):
+        return list(tabla.columns)
+
+    def renombrar(self, tabla, nombres):
+        proyeccion = ', '.join(
+            f"{_ident(c)} AS {_ident(nombres.get(c, c))}" for c in tabla.columns
+        )
+        return tabla.project(proyeccion)
+
+    def contar(self, tabla, nulos_en=None):
+        if nulos_en is None:
+            return tabla.aggregate('count(*)').fetchone()[0]
+        return tabla.aggregate(f"count(*) FILTER (WHERE {_ident(nulos_en)} IS NULL)").fetchone()[0]
+
+    def filtrar_demo(self, tabla, columna):
+        return tabla.filter(f"NOT contains(lower({_ident(columna)}), 'demo')")
+
+    def recortar(self, tabla, columnas):
+        objetivo = set(columnas)
+        proyeccion = ', '.join(
+            f"trim({_ident(c)}, {_literal(ESPACIOS)}) AS {_ident(c)}" if c in objetivo else _ident(c)
+            for c in tabla.columns
+        )
+        return tabla.project(proyeccion)
+
+    def _variable_mapa(self, claves, valores):
+        """Guarda un MAP constante en una variable de sesión (evita joins que reordenan filas)"""
+        nombre = self._nuevo_nombre('mapa')
+        self.con.register(nombre, pd.DataFrame({'k': claves, 'v': valores}))
+        self.con.execute(f"SET VARIABLE {nombre} = (SELECT map(list(k), list(v)) FROM {nombre})")
+        self.con.unregister(nombre)
+        return nombre
+
+    def cruzar(self, tabla, catalogo, clave, valor):
+        # Agrupar todos los valores por clave para reproducir las filas
+        # duplicadas que genera un merge cuando el catálogo repite la clave
+        agrupado = {}
+        for k, v in zip(catalogo[clave], catalogo[valor]):
+            agrupado.setdefault(k, []).append(None if pd.isna(v) else v)
+        mapa = self._variable_mapa(list(agrupado.keys()), list(agrupado.values()))
+        return tabla.project(
+            f"*, unnest(coalesce(map_extract(getvariable('{mapa}'), {_ident(clave)})[1], [NULL])) "
+            f"AS {_ident(valor)}"
+        )
+
+    def mapear(self, tabla, columna, diccionario, destino):
+        mapa = self._variable_mapa(list(diccionario.keys()), list(diccionario.values()))
+        return tabla.project(
+            f"*, map_extract(getvariable('{mapa}'), {_ident(columna)})[1] AS {_ident(destino)}"
+        )
+
+    def aplicar(self, tabla, columna, funcion, destino):
+        nombre = self._nuevo_nombre('fn')
+        self.con.create_function(nombre, funcion, ['VARCHAR'], 'VARCHAR')
+        return tabla.project(f"*, {nombre}({_ident(columna)}) AS {_ident(destino)}")
+
+    def reemplazar_con(self, tabla, destino, origen, defecto):
+        proyeccion = ', '.join(
+            f"coalesce({_ident(origen)}, {_literal(defecto)}) AS {_ident(c)}" if c == destino else _ident(c)
+            for c in tabla.columns if c != origen
+        )
+        return tabla.project(proyeccion)
+
+    def materializar(self, tabla):
+        nombre = self._nuevo_nombre('tabla')
+        tabla.create(nombre)
+        return self.con.table(nombre)
+
+    def a_pandas(self, tabla):
+        return tabla.df()
+
+    def escribir_csv(self, tabla, ruta, sep=','):
+        lector = tabla.fetch_record_batch(FILAS_POR_BLOQUE)
+        _escribir_bloques((lote.to_pandas() for lote in lector), ruta, sep)
+
+    def cerrar(self):
+        self.con.close()
+        for ruta in self._temporales:
+            os.remove(ruta)
+        self._temporales = []
+
+# ===============================================================
+# MOTOR POLARS
+# ===============================================================
+class MotorPolars:
+    """Motor Polars: LazyFrames ejecutados con el motor de streaming"""
+
+    nombre = 'polars'
+
+    def __init__(self, hilos=None):
+        # El pool de hilos de Polars se fija al importarlo (POLARS_MAX_THREADS)
+        if hilos and 'polars' not in sys.modules:
+            os.environ['POLARS_MAX_THREADS'] = str(hilos)
+        import polars
+        self.pl = polars
+        self._temporales = []
+
+    def leer_csv(self, ruta, sep, encoding, omitir_lineas_malas=False):
+        if omitir_lineas_malas:
+            raise ValueError(
+                "El motor polars no puede omitir líneas mal formadas; use pandas o duckdb"
+            )
+        ruta_utf8 = _a_utf8(ruta, encoding)
+        if ruta_utf8 != ruta:
+            self._temporales.append(ruta_utf8)
+
+        # pandas (keep_default_na=False) lee los vacíos como '' y no como NULL
+        return self.pl.scan_csv(
+            ruta_utf8,
+            separator=sep,
+            infer_schema=False
+        ).with_columns(self.pl.all().fill_null(''))
+
+    def columnas(self, tabla):
+        return tabla.collect_schema().names()
+
+    def renombrar(self, tabla, nombres):
+        return tabla.rename(nombres)
+
+    def contar(self, tabla, nulos_en=None):
+        pl = self.pl
+        if nulos_en is None:
+            return tabla.select(pl.len()).collect().item()
+        return tabla.select(pl.col(nulos_en).is_null().sum()).collect().item()
+
+    def filtrar_demo(self, tabla, columna):
+        pl = self.pl
+        return tabla.filter(
+            ~pl.col(columna).str.to_lowercase().str.contains('demo', literal=True)
+        )
+
+    def recortar(self, tabla, columnas):
+        pl = self.pl
+        return tabla.with_columns([pl.col(c).str.strip_chars(ESPACIOS) for c in columnas])
+
+    def cruzar(self, tabla, catalogo, clave, valor):
+        pl = self.pl
+        derecha = pl.LazyFrame(
+            {clave: catalogo[clave].tolist(), valor: catalogo[valor].tolist()},
+            schema={clave: pl.Utf8, valor: pl.Utf8}
+        ).with_row_index('__fila_der')
+        # Índices explícitos para conservar el orden exacto de DataFrame.merge
+        return (
+            tabla.with_row_index('__fila_izq')
+            .join(derecha, on=clave, how='left')
+            .sort(['__fila_izq', '__fila_der'], nulls_last=True)
+            .drop(['__fila_izq', '__fila_der'])
+        )
+
+    def mapear(self, tabla, columna, diccionario, destino):
+        pl = self.pl
+        return tabla.with_columns(
+            pl.col(columna)
+            .replace_strict(diccionario, default=None, return_dtype=pl.Utf8)
+            .alias(destino)
+        )
+
+    def aplicar(self, tabla, columna, funcion, destino):
+        pl = self.pl
+        return tabla.with_columns(
+            pl.col(columna).map_elements(funcion, return_dtype=pl.Utf8).alias(destino)
+        )
+
+    def reemplazar_con(self, tabla, destino, origen, defecto):
+        pl = self.pl
+        return tabla.with_columns(
+            pl.col(origen).fill_null(defecto).alias(destino)
+        ).drop(origen)
+
+    def materializar(self, tabla):
+        # A un parquet temporal con el motor de streaming: no pasa por memoria
+        fd, ruta = tempfile.mkstemp(suffix='.parquet', prefix='limpieza_')
+        os.close(fd)
+        self._temporales.append(ruta)
+        tabla.sink_parquet(ruta, engine='streaming')
+        return self.pl.scan_parquet(ruta)
+
+    def a_pandas(self, tabla):
+        return tabla.collect(engine='streaming').to_pandas()
+
+    def escribir_csv(self, tabla, ruta, sep=','):
+        lotes = tabla.collect_batches(chunk_size=FILAS_POR_BLOQUE, engine='streaming')
+        _escribir_bloques((lote.to_pandas() for lote in lotes), ruta, sep)
+
+    def cerrar(self):
+        for ruta in self._temporales:
+            os.remove(ruta)
+        self._temporales = []
+
+# ===============================================================
+# REGISTRO DE MOTORES
+# ===============================================================
+MOTORES = {
+    'pandas': MotorPandas,
+    'duckdb': MotorDuckDB,
+    'polars': MotorPolars
+}
+
+def obtener_motor(nombre=None, hilos=None):
+    """
+    Crea una instancia del motor de limpieza solicitado
+
+    Args:
+        nombre (str): 'pandas', 'duckdb' o 'polars' (por defecto MOTOR_LIMPIEZA)
+        hilos (int): Hilos del motor (por defecto todos los núcleos). Polars
+            solo lo aplica si todavía no fue importado en el proceso
+
+    Returns:
+        Motor de limpieza listo para usar
+    """
+    nombre = (nombre or MOTOR_POR_DEFECTO).lower()
+    if nombre not in MOTORES:
+        raise ValueError(f"Motor desconocido: {nombre}. Opciones: {', '.join(MOTORES)}")
+    try:
+        return MOTORES[nombre](hilos)
+    except ImportError as e:
+        raise ImportError(
+            f"El motor '{nombre}' requiere un paquete no instalado ({e.name}). "
+            f"Instálalo con: pip install {nombre}"
+        ) from e
+
+def cerrar_motor(motor):
+    """Libera conexiones y archivos temporales del motor (si los tiene)"""
+    cerrar = getattr(motor, 'cerrar', None)
+    if cerrar is not None:
+        cerrar()
+
+def opcion_desde_argv(nombre, argv=None):
+    """Lee el valor de una opción `--nombre valor` o `--nombre=valor`"""
+    argv = sys.argv[1:] if argv is None else argv
+    for i, arg in enumerate(argv):
+        if arg == nombre and i + 1 < len(argv):
+            return argv[i + 1]
+        if arg.startswith(nombre + '='):
+            return arg.split('=', 1)[1]
+    return None
+
+def motor_desde_argv(argv=None):
+    """Lee la opción --engine <nombre> de la línea de comandos"""
+    return opcion_desde_argv('--engine', argv)
@@ -5,8 +5,14 @@ Descripción: Limpia archivo de reporte de equipos y normaliza aseguradoras
 """
 import pandas as pd
 import os
-import csv
 import sys
+import glob
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+from cleaning_engine import obtener_motor, cerrar_motor, motor_desde_argv, opcion_desde_argv
+from etl_profiler import activar_desde_argv, etapa, finalizar
+from format_detection import detectar_formato
 
 # ===============================================================
 # CONFIGURACIÓN
@@ -22,6 +28,13 @@ RUTA_ASEGURADORAS = os.path.join(DATA_DIR, "Aseguradora y Capita.csv")
 # Archivo de salida
 RUTA_SALIDA = os.path.join(DATA_DIR, "Reporte_Equipos_Limpio.csv")
 
+# Salidas del modo lote (--lote)
+NOMBRE_CONSOLIDADO = "Reporte_Equipos_Consolidado_Limpio.csv"
+NOMBRE_RESUMEN_LOTE = "Reporte_Equipos_Resumen_Lote.csv"
+
+# Archivos que se toman cuando --lote recibe un directorio
+PATRON_REPORTES = "*Reporte*Equipos*.csv"
+
 # ===============================================================
 # FUNCIONES AUXILIARES
 # ===============================================================
@@ -35,19 +48,7 @@ def detectar_separador_y_encoding(ruta):
     Returns:
         tuple: (separador, encoding)
     """
-    encodings = ['utf-8-sig', 'latin1', 'windows-1252', 'utf-8']
-    
-    for encoding in encodings:
-        try:
-            with open(ruta, 'r', encoding=encoding) as f:
-                primera_linea = f.readline()
-                sniffer = csv.Sniffer()
-                separador = sniffer.sniff(primera_linea).delimiter
-                return separador, encoding
-        except Exception:
-            continue
-    
-    raise ValueError(f"No se pudo detectar separador ni encoding del archivo: {ruta}")
+    return detectar_formato(ruta)
 
 def verificar_archivo(ruta, nombre):
     """Verifica que el archivo exista"""
@@ -57,11 +58,106 @@ def verificar_archivo(ruta, nombre):
         return False
     return True
 
+def _silencio(*args, **kwargs):
+    """Reemplazo de print para los procesos del modo lote"""
+    pass
+
+def cargar_aseguradoras(ruta, log=print):
+    """
+    Lee y normaliza el catálogo de aseguradoras
+    
+    Args:
+        ruta (str): Ruta a Aseguradora y Capita.csv
+        log: Función de salida (print por defecto)
+        
+    Returns:
+        DataFrame: Columnas 'Aseguradora' y 'Codigo Sistema' como texto recortado
+    """
+    sep_aseg, enc_aseg = detectar_separador_y_encoding(ruta)
+    log(f"   Aseguradoras → separador: '{sep_aseg}', encoding: {enc_aseg}")
+    
+    aseguradoras = pd.read_csv(
+        ruta, 
+        sep=sep_aseg, 
+        encoding=enc_aseg, 
+        dtype=str,
+        keep_default_na=False
+    )
+    aseguradoras['Aseguradora'] = aseguradoras['Aseguradora'].str.strip()
+    aseguradoras['Codigo Sistema'] = aseguradoras['Codigo Sistema'].str.strip()
+    return aseguradoras[['Aseguradora', 'Codigo Sistema']]
+
+def limpiar_archivo_reporte(ruta_reporte, aseguradoras, ruta_salida, motor, log=print):
+    """
+    Limpia un archivo de reporte de equipos con un catálogo ya cargado
+    
+    Args:
+        ruta_reporte (str): Ruta al reporte crudo
+        aseguradoras (DataFrame): Catálogo de cargar_aseguradoras()
+        ruta_salida (str): Ruta del CSV limpio
+        motor: Motor de limpieza ya creado (ver cleaning_engine)
+        log: Función de salida (print por defecto)
+        
+    Returns:
+        dict: Conteos originales, eliminados, sin_codigo y finales
+    """
+    sep_reporte, enc_reporte = detectar_separador_y_encoding(ruta_reporte)
+    log(f"   Reporte Equipos → separador: '{sep_reporte}', encoding: {enc_reporte}")
+    
+    # Cargar archivo
+    log(f"\n📥 Cargando archivos (motor: {motor.nombre})...")
+    # Los motores lazy (duckdb, polars) re-ejecutan los pasos en cada conteo:
+    # se materializa tras la lectura y tras el cruce para leer el CSV y
+    # cruzar el catálogo una sola vez
+    reporte = motor.materializar(motor.leer_csv(ruta_reporte, sep_reporte, enc_reporte))
+    
+    reporte_original = motor.contar(reporte)
+    log(f"   Registros originales: {reporte_original:,}")
+    
+    # Limpieza: eliminar registros DEMO
+    log("\n🧹 Eliminando registros DEMO...")
+    reporte = motor.filtrar_demo(reporte, 'Documento Paciente')
+    eliminados = reporte_original - motor.contar(reporte)
+    log(f"   Eliminados: {eliminados:,} registros")
+    
+    # Normalizar texto
+    log("\n🔤 Normalizando texto...")
+    reporte = motor.recortar(reporte, ['Aseguradora'])
+    
+    # Cruce con catálogo de aseguradoras
+    log("\n🔗 Cruzando con catálogo de aseguradoras...")
+    reporte = motor.materializar(motor.cruzar(reporte, aseguradoras, 'Aseguradora', 'Codigo Sistema'))
+    reporte_final = motor.contar(reporte)
+    
+    # Reemplazar nombre por código
+    sin_codigo = motor.contar(reporte, nulos_en='Codigo Sistema')
+    if sin_codigo > 0:
+        log(f"   ⚠️  {sin_codigo} registros sin código de aseguradora (se marcará 'No Aplica')")
+    
+    reporte = motor.reemplazar_con(reporte, 'Aseguradora', 'Codigo Sistema', 'No Aplica')
+    
+    # Guardar resultado
+    log("\n💾 Guardando archivo limpio...")
+    motor.escribir_csv(reporte, ruta_salida)
+    
+    return {
+        'originales': reporte_original,
+        'eliminados': eliminados,
+        'sin_codigo': sin_codigo,
+        'finales': reporte_final
+    }
+
 # ===============================================================
 # PROCESO PRINCIPAL
 # ===============================================================
-def limpiar_reporte_equipos():
-    """Limpia el reporte de equipos"""
+def limpiar_reporte_equipos(motor=None):
+    """
+    Limpia el reporte de equipos
+    
+    Args:
+        motor (str): Motor de ejecución ('pandas', 'duckdb' o 'polars').
+            Por defecto usa MOTOR_LIMPIEZA o pandas.
+    """
     print("="*60)
     print("LIMPIEZA: REPORTE EQUIPOS")
     print("="*60)
@@ -75,69 +171,20 @@ def limpiar_reporte_equipos():
     try:
         # Detectar formato
         print("\n📄 Detectando formato de archivos...")
-        sep_reporte, enc_reporte = detectar_separador_y_encoding(RUTA_REPORTE)
-        sep_aseg, enc_aseg = detectar_separador_y_encoding(RUTA_ASEGURADORAS)
-        
-        print(f"   Reporte Equipos → separador: '{sep_reporte}', encoding: {enc_reporte}")
-        print(f"   Aseguradoras → separador: '{sep_aseg}', encoding: {enc_aseg}")
+        with etapa('cargar_aseguradoras'):
+            aseguradoras = cargar_aseguradoras(RUTA_ASEGURADORAS)
         
-        # Cargar archivos
-        print("\n📥 Cargando archivos...")
-        reporte = pd.read_csv(RUTA_REPORTE, sep=sep_reporte, encoding=enc_reporte)
-        aseguradoras = pd.read_csv(
-            RUTA_ASEGURADORAS, 
-            sep=sep_aseg, 
-            encoding=enc_aseg, 
-            dtype=str
-        )
-        
-        print(f"   Registros originales: {len(reporte):,}")
-        
-        # Limpieza: eliminar registros DEMO
-        print("\n🧹 Eliminando registros DEMO...")
-        reporte_original = len(reporte)
-        reporte = reporte[
-            ~reporte['Documento Paciente']
-            .astype(str)
-            .str.contains("DEMO", case=False, na=False)
-        ]
-        eliminados = reporte_original - len(reporte)
-        print(f"   Eliminados: {eliminados:,} registros")
-        
-        # Normalizar texto
-        print("\n🔤 Normalizando texto...")
-        reporte['Aseguradora'] = reporte['Aseguradora'].astype(str).str.strip()
-        aseguradoras['Aseguradora'] = aseguradoras['Aseguradora'].astype(str).str.strip()
-        aseguradoras['Codigo Sistema'] = aseguradoras['Codigo Sistema'].astype(str).str.strip()
-        
-        # Cruce con catálogo de aseguradoras
-        print("\n🔗 Cruzando con catálogo de aseguradoras...")
-        reporte_antes = len(reporte)
-        reporte = reporte.merge(
-            aseguradoras[['Aseguradora', 'Codigo Sistema']],
-            on='Aseguradora',
-            how='left'
-        )
-        
-        # Reemplazar nombre por código
-        sin_codigo = reporte['Codigo Sistema'].isna().sum()
-        if sin_codigo > 0:
-            print(f"   ⚠️  {sin_codigo} registros sin código de aseguradora (se marcará 'No Aplica')")
-        
-        reporte['Aseguradora'] = reporte['Codigo Sistema'].fillna('No Aplica')
-        reporte.drop(columns=['Codigo Sistema'], inplace=True)
-        
-        # Guardar resultado
-        print("\n💾 Guardando archivo limpio...")
-        reporte.to_csv(RUTA_SALIDA, index=False, encoding='utf-8-sig')
+        motor = obtener_motor(motor)
+        with etapa('limpiar_reporte'):
+            conteos = limpiar_archivo_reporte(RUTA_REPORTE, aseguradoras, RUTA_SALIDA, motor)
         
         # Resumen
         print("\n" + "="*60)
         print("✅ LIMPIEZA COMPLETADA")
         print("="*60)
-        print(f"Registros originales: {reporte_original:,}")
-        print(f"Registros eliminados: {eliminados:,}")
-        print(f"Registros finales: {len(reporte):,}")
+        print(f"Registros originales: {conteos['originales']:,}")
+        print(f"Registros eliminados: {conteos['eliminados']:,}")
+        print(f"Registros finales: {conteos['finales']:,}")
         print(f"\nArchivo guardado en:\n{RUTA_SALIDA}")
         
         return True
@@ -147,13 +194,221 @@ def limpiar_reporte_equipos():
         import traceback
         traceback.print_exc()
         return False
+    finally:
+        cerrar_motor(motor)
+
+# ===============================================================
+# MODO LOTE (VARIOS ARCHIVOS EN PARALELO)
+# ===============================================================
+# Catálogo compartido por cada proceso del pool (se envía una vez por proceso)
+_ASEGURADORAS_TRABAJADOR = None
+
+def _iniciar_trabajador(aseguradoras):
+    global _ASEGURADORAS_TRABAJADOR
+    _ASEGURADORAS_TRABAJADOR = aseguradoras
+
+def _limpiar_en_trabajador(ruta_reporte, ruta_salida, nombre_motor, hilos):
+    """Limpia un archivo dentro de un proceso del pool; nunca lanza excepciones"""
+    resultado = {'archivo': ruta_reporte, 'salida': ruta_salida}
+    motor = None
+    try:
+        motor = obtener_motor(nombre_motor, hilos)
+        resultado.update(
+            limpiar_archivo_reporte(ruta_reporte, _ASEGURADORAS_TRABAJADOR, ruta_salida, motor, log=_silencio)
+        )
+        resultado['estado'] = 'OK'
+    except Exception as e:
+        resultado['estado'] = f"ERROR: {e}"
+    finally:
+        if motor is not None:
+            cerrar_motor(motor)
+    return resultado
+
+def buscar_reportes(entrada):
+    """
+    Lista los reportes a procesar
+    
+    Args:
+        entrada (str): Directorio (se toman los PATRON_REPORTES) o patrón glob
+        
+    Returns:
+        list: Rutas ordenadas, sin archivos ya limpios ni el catálogo de aseguradoras
+    """
+    patron = os.path.join(entrada, PATRON_REPORTES) if os.path.isdir(entrada) else entrada
+    catalogo = os.path.abspath(RUTA_ASEGURADORAS)
+    return sorted(
+        ruta for ruta in glob.glob(patron)
+        if not os.path.splitext(os.path.basename(ruta))[0].endswith('_Limpio')
+        and os.path.basename(ruta) != NOMBRE_RESUMEN_LOTE
+        and os.path.abspath(ruta) != catalogo
+        and os.path.basename(ruta) != os.path.basename(RUTA_ASEGURADORAS)
+    )
+
+def nombres_salida(reportes):
+    """
+    Nombre de salida único por reporte
+    
+    Los reportes por sucursal suelen llamarse igual en carpetas distintas:
+    si el nombre se repite se antepone la carpeta que los diferencia
+    (ej. sede_norte/Reporte Equipos.csv → sede_norte_Reporte Equipos_Limpio.csv).
+    
+    Args:
+        reportes (list): Rutas de entrada
+        
+    Returns:
+        list: Nombres de archivo de salida, en el mismo orden
+        
+    Raises:
+        ValueError: Si dos reportes no se pueden distinguir
+    """
+    def nombre(ruta, niveles):
+        partes = os.path.normpath(os.path.abspath(ruta)).split(os.sep)
+        carpetas = [p for p in partes[-1 - niveles:-1] if p]
+        base = os.path.splitext(partes[-1])[0]
+        return '_'.join(carpetas + [base]) + '_Limpio.csv'
+    
+    nombres = [nombre(ruta, 0) for ruta in reportes]
+    niveles = 0
+    while len(set(nombres)) < len(nombres):
+        niveles += 1
+        repetidos = {n for n in nombres if nombres.count(n) > 1}
+        anteriores = nombres
+        nombres = [
+            nombre(ruta, niveles) if actual in repetidos else actual
+            for ruta, actual in zip(reportes, nombres)
+        ]
+        if nombres == anteriores:
+            raise ValueError(f"Reportes con el mismo nombre de salida: {', '.join(sorted(repetidos))}")
+    return nombres
+
+def consolidar_salidas(rutas, ruta_consolidado):
+    """
+    Une los CSV limpios en un solo archivo
+    
+    Si todos comparten encabezado se concatenan como texto (memoria constante);
+    si no, se alinean las columnas con pandas.
+    """
+    encabezados = []
+    for ruta in rutas:
+        with open(ruta, 'r', encoding='utf-8-sig', newline='') as f:
+            encabezados.append(f.readline())
+    
+    if len(set(encabezados)) <= 1:
+        with open(ruta_consolidado, 'w', encoding='utf-8-sig', newline='') as destino:
+            for i, ruta in enumerate(rutas):
+                with open(ruta, 'r', encoding='utf-8-sig', newline='') as origen:
+                    encabezado = origen.readline()
+                    if i == 0:
+                        destino.write(encabezado)
+                    shutil.copyfileobj(origen, destino)
+    else:
+        print("   ⚠️  Los archivos tienen columnas distintas; se alinean con pandas")
+        partes = [pd.read_csv(ruta, dtype=str, keep_default_na=False, encoding='utf-8-sig') for ruta in rutas]
+        pd.concat(partes, ignore_index=True).to_csv(ruta_consolidado, index=False, encoding='utf-8-sig')
+
+def limpiar_lote_reportes(entrada, dir_salida=None, procesos=None, motor=None):
+    """
+    Limpia varios reportes de equipos en paralelo
+    
+    Args:
+        entrada (str): Directorio o patrón glob de reportes crudos
+        dir_salida (str): Carpeta de salida (por defecto DATA_DIR)
+        procesos (int): Procesos del pool (por defecto: núcleos disponibles)
+        motor (str): Motor de limpieza para cada archivo
+        
+    Returns:
+        bool: True si todos los archivos se limpiaron correctamente
+    """
+    print("="*60)
+    print("LIMPIEZA EN LOTE: REPORTE EQUIPOS")
+    print("="*60)
+    
+    dir_salida = dir_salida or DATA_DIR
+    reportes = buscar_reportes(entrada)
+    if not reportes:
+        print(f"❌ Error: No se encontraron reportes en {entrada}")
+        return False
+    if not verificar_archivo(RUTA_ASEGURADORAS, "Aseguradora y Capita"):
+        return False
+    os.makedirs(dir_salida, exist_ok=True)
+    
+    print(f"\n📂 {len(reportes)} archivos encontrados")
+    print("\n📄 Cargando catálogo de aseguradoras (una sola vez)...")
+    aseguradoras = cargar_aseguradoras(RUTA_ASEGURADORAS)
+    
+    try:
+        salidas = nombres_salida(reportes)
+    except ValueError as e:
+        print(f"❌ Error: {e}")
+        return False
+    tareas = [(ruta, os.path.join(dir_salida, salida)) for ruta, salida in zip(reportes, salidas)]
+    
+    # Los núcleos se reparten entre los procesos activos: sin esto cada
+    # trabajador con duckdb/polars abriría un hilo por núcleo
+    activos = min(procesos or os.cpu_count(), len(tareas))
+    hilos = max(1, os.cpu_count() // activos)
+    print(f"\n⚙️  Procesando con {procesos or os.cpu_count()} procesos ({hilos} hilos por motor)...")
+    with ProcessPoolExecutor(
+        max_workers=procesos,
+        initializer=_iniciar_trabajador,
+        initargs=(aseguradoras,)
+    ) as pool:
+        resultados = list(pool.map(
+            _limpiar_en_trabajador,
+            [ruta for ruta, _ in tareas],
+            [salida for _, salida in tareas],
+            [motor] * len(tareas),
+            [hilos] * len(tareas)
+        ))
+    
+    resumen = pd.DataFrame(resultados, columns=[
+        'archivo', 'originales', 'eliminados', 'sin_codigo', 'finales', 'estado', 'salida'
+    ])
+    conteos = ['originales', 'eliminados', 'sin_codigo', 'finales']
+    resumen[conteos] = resumen[conteos].astype('Int64')
+    
+    # Consolidado con los archivos que terminaron bien
+    correctos = resumen[resumen['estado'] == 'OK']
+    ruta_consolidado = os.path.join(dir_salida, NOMBRE_CONSOLIDADO)
+    if len(correctos) > 0:
+        print("\n💾 Generando consolidado...")
+        consolidar_salidas(correctos['salida'].tolist(), ruta_consolidado)
+    
+    ruta_resumen = os.path.join(dir_salida, NOMBRE_RESUMEN_LOTE)
+    resumen.to_csv(ruta_resumen, index=False, encoding='utf-8-sig')
+    
+    # Resumen
+    print("\n" + "="*60)
+    print("✅ LIMPIEZA EN LOTE COMPLETADA" if len(correctos) == len(resumen) else "⚠️  LIMPIEZA EN LOTE CON ERRORES")
+    print("="*60)
+    print(resumen.drop(columns=['salida']).to_string(index=False))
+    print(f"\nTotal registros finales: {int(correctos['finales'].sum()):,}")
+    if len(correctos) > 0:
+        print(f"\nConsolidado guardado en:\n{ruta_consolidado}")
+    print(f"Resumen por archivo en:\n{ruta_resumen}")
+    
+    return len(correctos) == len(resumen)
 
 # ===============================================================
 # EJECUCIÓN
 # ===============================================================
 if __name__ == "__main__":
+    # --profile[=directorio]: flamegraph por etapa (en modo lote solo el proceso principal)
+    activar_desde_argv()
     try:
-        exito = limpiar_reporte_equipos()
+        entrada_lote = opcion_desde_argv('--lote')
+        if entrada_lote:
+            procesos = opcion_desde_argv('--procesos')
+            with etapa('limpiar_lote_reportes'):
+                exito = limpiar_lote_reportes(
+                    entrada_lote,
+                    dir_salida=opcion_desde_argv('--salida'),
+                    procesos=int(procesos) if procesos else None,
+                    motor=motor_desde_argv()
+                )
+        else:
+            exito = limpiar_reporte_equipos(motor_desde_argv())
+        finalizar()
         sys.exit(0 if exito else 1)
     except KeyboardInterrupt:
         print("\n\n⚠️  Proceso interrumpido por el usuario")
@@ -0,0 +1,320 @@
+"""
+Reconciliación Fuente vs Data Warehouse
+Autor: Data Team
+Descripción: Verifica que dim_paciente, dim_pedido y dim_medicamento
+             coincidan con sus archivos fuente sin traer las tablas completas.
+
+Cada fila se reduce a un hash de 60 bits (md5 truncado) de su clave y
+columnas en forma canónica. Las filas se reparten en buckets por hash de la
+clave y se compara por bucket (cantidad de filas, suma de hashes): en el DW
+con un GROUP BY y en pandas con un groupby sobre los archivos. Solo los
+buckets distintos se bajan clave por clave para listar las diferencias.
+
+Las consultas usan funciones de PostgreSQL (MD5, ::BIT(60)); con un destino
+SQLite/DuckDB (DW_URL) la reconciliación se rechaza con un error.
+
+Uso:
+    python dw_reconciliation.py                      # las tres dimensiones
+    python dw_reconciliation.py dim_pedido --buckets 4096
+"""
+import hashlib
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text, bindparam
+
+# Agregar el directorio config al path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from dw_backend import obtener_engine, backend_para, BackendPostgres
+from etl_dimensions_clean import RUTAS, leer_csv, leer_pedidos, normalizar_pedidos, normalizar_medicamentos
+
+# ===============================================================
+# CONFIGURACIÓN
+# ===============================================================
+BUCKETS = 1024
+
+# Máximo de diferencias a listar por dimensión
+MAX_DIFERENCIAS = 20
+
+# ===============================================================
+# FUENTES (misma normalización que el ETL de dimensiones)
+# ===============================================================
+def fuente_pacientes():
+    df = pd.read_excel(
+        RUTAS['pacientes'],
+        usecols=['Identificacion', 'Nombre', 'Municipio',
+                 'Nombre Estado', 'Aseguradora', 'Zona', 'Fecha Ingreso'],
+        engine='openpyxl'
+    )
+    df.columns = [c.strip() for c in df.columns]
+    return pd.DataFrame({
+        'documento_paciente': df['Identificacion'].astype(str).str.strip(),
+        'nombre': df['Nombre'],
+        'municipio': df['Municipio'],
+        'estado': df['Nombre Estado'],
+        'aseguradora': df['Aseguradora'],
+        'zona': df['Zona'],
+        'fecha_ingreso': df['Fecha Ingreso']
+    })
+
+def fuente_pedidos():
+    # Misma lectura como texto que la carga a staging
+    return normalizar_pedidos(pd.concat(leer_pedidos(), ignore_index=True))
+
+def fuente_medicamentos():
+    df = leer_csv(RUTAS['medicamentos'])
+    df.columns = [c.strip() for c in df.columns]
+    return normalizar_medicamentos(df)
+
+# clave: llave natural; columnas: (nombre, tipo canónico); filtro: WHERE del DW
+DIMENSIONES = {
+    'dim_paciente': {
+        'clave': 'documento_paciente',
+        'columnas': [('nombre', 'texto'), ('municipio', 'texto'), ('estado', 'texto'),
+                     ('aseguradora', 'texto'), ('zona', 'texto'), ('fecha_ingreso', 'fecha')],
+        'filtro': 'es_actual = TRUE',
+        'fuente': fuente_pacientes
+    },
+    'dim_pedido': {
+        'clave': 'numero_pedido',
+        'columnas': [('insumo_solicitado', 'texto'), ('cantidad', 'numero')],
+        'filtro': None,
+        'fuente': fuente_pedidos
+    },
+    'dim_medicamento': {
+        'clave': 'codigo',
+        'columnas': [('nombre', 'texto'), ('forma_farmaceutica', 'texto'),
+                     ('via_administracion', 'texto')],
+        'filtro': None,
+        'fuente': fuente_medicamentos
+    }
+}
+
+# ===============================================================
+# FORMA CANÓNICA Y HASH
+# ===============================================================
+# La misma representación de texto en SQL (Postgres) y en pandas
+def _canonico_sql(columna, tipo):
+    if tipo == 'numero':
+        return f"COALESCE(CAST(CAST({columna} AS NUMERIC(18,4)) AS TEXT), '')"
+    if tipo == 'fecha':
+        return f"COALESCE(TO_CHAR({columna}, 'YYYY-MM-DD'), '')"
+    return f"COALESCE(CAST({columna} AS TEXT), '')"
+
+def _canonico_pandas(serie, tipo):
+    if tipo == 'numero':
+        # Se formatea cada valor distinto una vez (las cantidades se repiten
+        # mucho); el código -1 de los nulos toma el '' del final
+        codigos, unicos = pd.factorize(pd.to_numeric(serie, errors='coerce'))
+        textos = np.array([f"{x:.4f}" for x in unicos] + [''], dtype=object)
+        return pd.Series(textos[codigos], index=serie.index)
+    if tipo == 'fecha':
+        return pd.to_datetime(serie, errors='coerce').dt.strftime('%Y-%m-%d').fillna('')
+    return serie.where(serie.notna(), '').astype(str)
+
+def _hash60_sql(expresion):
+    """Primeros 15 dígitos hex del md5 como BIGINT (siempre positivo)"""
+    return f"('x' || SUBSTR(MD5({expresion}), 1, 15))::BIT(60)::BIGINT"
+
+def _hash60(textos):
+    """
+    Mismo valor que _hash60_sql: los 60 bits altos del md5
+
+    El md5 tiene que coincidir con el MD5 de Postgres, y ni numpy ni pandas
+    lo vectorizan: se calcula por fila en hashlib (C), pero los bytes se
+    juntan en un solo buffer y la conversión a entero es vectorizada.
+    """
+    md5 = hashlib.md5
+    digests = b''.join(md5(t.encode('utf-8')).digest()[:8] for t in textos)
+    return (np.frombuffer(digests, dtype='>u8') >> 4).astype(np.int64)
+
+def hashes_fuente(df, spec, buckets):
+    """
+    Hash por clave y bucket de cada fila de la fuente
+
+    Las claves repetidas se resuelven como en la carga: gana la última.
+
+    Returns:
+        DataFrame: clave, hash_fila, bucket
+    """
+    clave = spec['clave']
+    df = df.drop_duplicates(subset=[clave], keep='last')
+
+    claves = _canonico_pandas(df[clave], 'texto')
+    fila = claves
+    for columna, tipo in spec['columnas']:
+        fila = fila.str.cat(_canonico_pandas(df[columna], tipo), sep='|')
+
+    return pd.DataFrame({
+        'clave': claves.values,
+        'hash_fila': _hash60(fila),
+        'bucket': _hash60(claves) % buckets
+    })
+
+def _verificar_destino(conn):
+    """Las consultas de checksum solo existen para PostgreSQL"""
+    backend = backend_para(conn)
+    if not isinstance(backend, BackendPostgres):
+        raise ValueError(
+            f"La reconciliación requiere PostgreSQL (MD5, ::BIT(60)); "
+            f"el destino actual es {backend.dialecto}"
+        )
+
+def _subconsulta_dw(conn, dimension, spec, buckets):
+    clave_sql = _canonico_sql(spec['clave'], 'texto')
+    fila_sql = " || '|' || ".join(
+        [clave_sql] + [_canonico_sql(c, t) for c, t in spec['columnas']]
+    )
+    where = f"WHERE {spec['filtro']}" if spec['filtro'] else ''
+    return f"""
+        SELECT {clave_sql} AS clave,
+               {_hash60_sql(fila_sql)} AS hash_fila,
+               MOD({_hash60_sql(clave_sql)}, {buckets}) AS bucket
+        FROM {backend_para(conn).tabla_dw(dimension)}
+        {where}
+    """
+
+# ===============================================================
+# COMPARACIÓN
+# ===============================================================
+def checksums_dw(conn, dimension, spec, buckets):
+    """Filas y suma de hashes por bucket, calculados en la base de datos"""
+    sql = f"""
+        SELECT bucket, COUNT(*) AS filas, SUM(hash_fila) AS suma
+        FROM ({_subconsulta_dw(conn, dimension, spec, buckets)}) t
+        GROUP BY bucket
+    """
+    return {int(b): (int(n), int(s)) for b, n, s in conn.execute(text(sql))}
+
+def checksums_fuente(hashes):
+    """Filas y suma de hashes por bucket, calculados en pandas"""
+    # 60 bits × millones de filas excede int64: se suman por separado los
+    # 30 bits altos y bajos (cada suma cabe en int64) y se recombinan
+    partes = pd.DataFrame({
+        'bucket': hashes['bucket'],
+        'alto': hashes['hash_fila'].values >> 30,
+        'bajo': hashes['hash_fila'].values & ((1 << 30) - 1)
+    })
+    sumas = partes.groupby('bucket').agg(filas=('alto', 'size'), alto=('alto', 'sum'), bajo=('bajo', 'sum'))
+    return {
+        int(b): (int(r.filas), (int(r.alto) << 30) + int(r.bajo))
+        for b, r in zip(sumas.index, sumas.itertuples(index=False))
+    }
+
+def hashes_dw_en_buckets(conn, dimension, spec, buckets, seleccion):
+    """Hash por clave del DW solo para los buckets indicados"""
+    sql = text(f"""
+        SELECT clave, hash_fila
+        FROM ({_subconsulta_dw(conn, dimension, spec, buckets)}) t
+        WHERE bucket IN :seleccion
+    """).bindparams(bindparam('seleccion', expanding=True))
+    return dict(conn.execute(sql, {'seleccion': list(seleccion)}).fetchall())
+
+def reconciliar_dimension(conn, dimension, buckets=BUCKETS, df_fuente=None):
+    """
+    Compara una dimensión del DW contra su archivo fuente
+
+    Args:
+        conn: Conexión SQLAlchemy
+        dimension (str): Clave de DIMENSIONES
+        buckets (int): Cantidad de buckets
+        df_fuente (DataFrame): Fuente ya leída (por defecto se lee el archivo)
+
+    Returns:
+        dict: Conteos y listas de claves faltantes, sobrantes y distintas
+    """
+    _verificar_destino(conn)
+    spec = DIMENSIONES[dimension]
+    if df_fuente is None:
+        df_fuente = spec['fuente']()
+
+    hashes = hashes_fuente(df_fuente, spec, buckets)
+    fuente = checksums_fuente(hashes)
+    dw = checksums_dw(conn, dimension, spec, buckets)
+
+    distintos = sorted(b for b in set(fuente) | set(dw) if fuente.get(b) != dw.get(b))
+    resultado = {
+        'dimension': dimension,
+        'filas_fuente': len(hashes),
+        'filas_dw': sum(n for n, _ in dw.values()),
+        'buckets': buckets,
+        'buckets_distintos': len(distintos),
+        'faltantes_en_dw': [],
+        'sobrantes_en_dw': [],
+        'distintas': []
+    }
+    if not distintos:
+        return resultado
+
+    # Bajar solo las claves de los buckets que no coinciden
+    dw_claves = hashes_dw_en_buckets(conn, dimension, spec, buckets, distintos)
+    fuente_claves = dict(
+        hashes[hashes['bucket'].isin(distintos)][['clave', 'hash_fila']].itertuples(index=False)
+    )
+
+    resultado['faltantes_en_dw'] = sorted(set(fuente_claves) - set(dw_claves))
+    resultado['sobrantes_en_dw'] = sorted(set(dw_claves) - set(fuente_claves))
+    resultado['distintas'] = sorted(
+        k for k in set(fuente_claves) & set(dw_claves) if fuente_claves[k] != dw_claves[k]
+    )
+    return resultado
+
+def imprimir_resultado(r):
+    ok = r['buckets_distintos'] == 0
+    print(f"\n{'✅' if ok else '❌'} {r['dimension']}: fuente {r['filas_fuente']:,} filas, "
+          f"DW {r['filas_dw']:,} filas, {r['buckets_distintos']}/{r['buckets']} buckets distintos")
+    for etiqueta, llave in [('Faltantes en DW', 'faltantes_en_dw'),
+                            ('Sobrantes en DW', 'sobrantes_en_dw'),
+                            ('Con valores distintos', 'distintas')]:
+        claves = r[llave]
+        if claves:
+            muestra = ', '.join(str(k) for k in claves[:MAX_DIFERENCIAS])
+            extra = f" (+{len(claves) - MAX_DIFERENCIAS} más)" if len(claves) > MAX_DIFERENCIAS else ''
+            print(f"   {etiqueta}: {len(claves):,} → {muestra}{extra}")
+
+# ===============================================================
+# MAIN
+# ===============================================================
+def main(dimensiones=None, buckets=BUCKETS):
+    """Reconcilia las dimensiones indicadas. Retorna True si todas coinciden"""
+    print("="*60)
+    print("RECONCILIACIÓN FUENTE vs DW")
+    print("="*60)
+
+    dimensiones = dimensiones or list(DIMENSIONES)
+    engine = obtener_engine()
+    todo_ok = True
+
+    with engine.connect() as conn:
+        try:
+            _verificar_destino(conn)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return False
+        for dimension in dimensiones:
+            resultado = reconciliar_dimension(conn, dimension, buckets)
+            imprimir_resultado(resultado)
+            todo_ok = todo_ok and resultado['buckets_distintos'] == 0
+
+    print("\n" + "="*60)
+    print("✅ TODO COINCIDE" if todo_ok else "❌ HAY DIFERENCIAS")
+    print("="*60)
+    return todo_ok
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    buckets = BUCKETS
+    if '--buckets' in args:
+        i = args.index('--buckets')
+        buckets = int(args[i + 1])
+        del args[i:i + 2]
+
+    desconocidas = [d for d in args if d not in DIMENSIONES]
+    if desconocidas:
+        print(f"❌ Dimensiones desconocidas: {', '.join(desconocidas)}")
+        print(f"   Opciones: {', '.join(DIMENSIONES)}")
+        sys.exit(1)
+
+    sys.exit(0 if main(args or None, buckets) else 1)
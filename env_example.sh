@@ -11,6 +11,10 @@ DB_HOST=localhost
 DB_PORT=5432
 DB_NAME=dw_HHCC
 
+# Destino alternativo del ETL de dimensiones (opcional, ver dw_backend.py)
+# DW_URL=sqlite:///dw_local.db
+# DW_URL=duckdb:///dw_local.duckdb
+
 # =====================================================
 # CONFIGURACIÓN DE ENTORNO
 # =====================================================
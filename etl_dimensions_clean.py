@@ -2,15 +2,24 @@
 ETL para Carga de Dimensiones
 Autor: Data Team
 Descripción: Carga inicial y actualización de todas las dimensiones del DW
+
+El destino lo define dw_backend: Postgres (config/database_config.py) o un
+archivo SQLite/DuckDB local vía DW_URL, ej.
+    DW_URL=sqlite:///dw_local.db python etl_dimensions_clean.py
 """
+import hashlib
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 import sys
 import os
+from contextlib import contextmanager
 
 # Agregar el directorio config al path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from config.database_config import get_engine, SCHEMA_DW
+from dw_backend import obtener_engine, backend_para, BackendPostgres
+from etl_profiler import activar_desde_argv, etapa, instrumentar, finalizar
+from external_dedup import DeduplicadorExterno, FILAS_POR_BLOQUE
+from format_detection import detectar_formato
 
 # ==============================
 # RUTAS DE ARCHIVOS
@@ -28,9 +37,46 @@ RUTAS = {
     'reporte': os.path.join(DATA_DIR, 'Reporte Equipos.csv')
 }
 
+# Archivo leído → tabla de staging
+TABLAS_STAGING = {
+    'equipos': 'stg_maestro_equipos',
+    'pacientes': 'stg_maestro_pacientes',
+    'aseguradoras': 'stg_maestro_aseguradoras',
+    'reporte': 'stg_reporte_equipos',
+    'medicamentos': 'stg_maestro_medicamentos',
+    'insumos': 'stg_maestro_insumos',
+    'pedidos': 'stg_pedidos'
+}
+
+# ==============================
+# MODO DE CARGA
+# ==============================
+# 'transaccion': todas las dimensiones en una sola transacción (estricto)
+# 'lotes': commit cada TAMANO_LOTE filas con marcadores reanudables
+MODO_CARGA = os.getenv('MODO_CARGA', 'transaccion')
+TAMANO_LOTE = int(os.getenv('TAMANO_LOTE', '5000'))
+
 # ==============================
 # FUNCIONES DE LECTURA
 # ==============================
+def leer_csv(ruta, **opciones):
+    """Lee un CSV con el parser C usando el separador y encoding detectados"""
+    sep, encoding = detectar_formato(ruta)
+    return pd.read_csv(ruta, sep=sep, encoding=encoding, **opciones)
+
+def leer_pedidos(chunksize=FILAS_POR_BLOQUE):
+    """
+    Lee el historial de pedidos por bloques (puede no caber en memoria)
+    
+    Todas las columnas se leen como texto: con dtype inferido por bloque el
+    mismo numero_pedido saldría '12' en un bloque y '12.0' en otro.
+    
+    Returns:
+        generator: DataFrames con los nombres de columna sin espacios
+    """
+    bloques = leer_csv(RUTAS['pedidos'], dtype=str, chunksize=chunksize)
+    return (bloque.rename(columns=str.strip) for bloque in bloques)
+
 def leer_archivos():
     """Lee todos los archivos fuente"""
     print("📂 Leyendo archivos fuente...")
@@ -53,44 +99,21 @@ def leer_archivos():
         )
         
         # CSV files
-        archivos['equipos'] = pd.read_csv(
-            RUTAS['equipos'], 
-            sep=';', 
-            engine='python', 
-            encoding='latin1'
-        )
-        
-        archivos['medicamentos'] = pd.read_csv(
-            RUTAS['medicamentos'], 
-            sep=None, 
-            engine='python', 
-            encoding='latin1'
-        )
+        archivos['equipos'] = leer_csv(RUTAS['equipos'])
         
-        archivos['insumos'] = pd.read_csv(
-            RUTAS['insumos'], 
-            sep=None, 
-            engine='python', 
-            encoding='latin1'
-        )
+        archivos['medicamentos'] = leer_csv(RUTAS['medicamentos'])
         
-        archivos['pedidos'] = pd.read_csv(
-            RUTAS['pedidos'], 
-            sep=None, 
-            engine='python', 
-            encoding='latin1'
-        )
+        archivos['insumos'] = leer_csv(RUTAS['insumos'])
         
-        archivos['reporte'] = pd.read_csv(
-            RUTAS['reporte'], 
-            sep=',', 
-            encoding='utf-8-sig'
-        )
+        archivos['reporte'] = leer_csv(RUTAS['reporte'])
         
         # Limpiar nombres de columnas
         for key in archivos:
             archivos[key].columns = [c.strip() for c in archivos[key].columns]
         
+        # El historial de pedidos se pasa a staging por bloques, sin leerlo completo
+        archivos['pedidos'] = leer_pedidos()
+        
         print("✅ Archivos leídos correctamente")
         return archivos
         
@@ -110,61 +133,9 @@ def cargar_staging(archivos, engine):
     print("\n📥 Cargando staging...")
     
     try:
-        archivos['equipos'].to_sql(
-            'stg_maestro_equipos', 
-            engine, 
-            schema='stg', 
-            if_exists='replace', 
-            index=False
-        )
-        
-        archivos['pacientes'].to_sql(
-            'stg_maestro_pacientes', 
-            engine, 
-            schema='stg', 
-            if_exists='replace', 
-            index=False
-        )
-        
-        archivos['aseguradoras'].to_sql(
-            'stg_maestro_aseguradoras', 
-            engine, 
-            schema='stg', 
-            if_exists='replace', 
-            index=False
-        )
-        
-        archivos['reporte'].to_sql(
-            'stg_reporte_equipos', 
-            engine, 
-            schema='stg', 
-            if_exists='replace', 
-            index=False
-        )
-        
-        archivos['medicamentos'].to_sql(
-            'stg_maestro_medicamentos', 
-            engine, 
-            schema='stg', 
-            if_exists='replace', 
-            index=False
-        )
-        
-        archivos['insumos'].to_sql(
-            'stg_maestro_insumos', 
-            engine, 
-            schema='stg', 
-            if_exists='replace', 
-            index=False
-        )
-        
-        archivos['pedidos'].to_sql(
-            'stg_pedidos', 
-            engine, 
-            schema='stg', 
-            if_exists='replace', 
-            index=False
-        )
+        backend = backend_para(engine)
+        for clave, tabla in TABLAS_STAGING.items():
+            backend.escribir_staging(archivos[clave], tabla, engine)
         
         print("✅ Staging cargado correctamente")
         
@@ -175,216 +146,396 @@ def cargar_staging(archivos, engine):
 # ==============================
 # POBLACIÓN DE DIMENSIONES
 # ==============================
+# Cada dimensión se divide en preparar_* (lee y normaliza staging) y
+# cargar_lote_* (escribe un bloque de filas en el DW). poblar_dim_* carga
+# todo lo preparado de una vez (dim_pedido, partición por partición);
+# poblar_por_lotes lo hace en bloques.
+# Las escrituras son set-based a través del backend del destino.
+
+# Columnas que solo se asignan al insertar una clave nueva
+EXTRAS_NUEVA_VERSION = {'vigente_desde': 'CURRENT_DATE', 'es_actual': 'TRUE'}
+
+# Operación del backend por dimensión: (tipo, clave, columnas, opciones).
+# También la usa verificar_planes para revisar las sentencias antes de cargar.
+CARGAS = {
+    'dim_aseguradora': ('actualizar_o_insertar', 'aseguradora_nk', ['aseguradora'],
+                        {'extras_insert': EXTRAS_NUEVA_VERSION, 'solo_actuales': True}),
+    'dim_paciente': ('actualizar_o_insertar', 'documento_paciente',
+                     ['nombre', 'municipio', 'estado', 'aseguradora', 'zona', 'fecha_ingreso'],
+                     {'extras_insert': EXTRAS_NUEVA_VERSION, 'solo_actuales': True}),
+    'dim_equipo': ('scd2', 'equipo_nk', ['equipo', 'estado_equipo'], {}),
+    'dim_pedido': ('upsert', 'numero_pedido', ['insumo_solicitado', 'cantidad'], {}),
+    'dim_medicamento': ('upsert', 'codigo', ['nombre', 'forma_farmaceutica', 'via_administracion'], {})
+}
+
+def cargar_bloque(conn, dimension, bloque):
+    """Aplica la operación de CARGAS a un bloque. Retorna el contador de la operación"""
+    tipo, clave, columnas, opciones = CARGAS[dimension]
+    operacion = getattr(backend_para(conn), tipo)
+    return operacion(conn, dimension, bloque, clave, columnas, **opciones)
+
+def preparar_dim_aseguradora(conn):
+    """Lee stg_maestro_aseguradoras"""
+    return backend_para(conn).leer_staging(conn, 'stg_maestro_aseguradoras')
+
+def cargar_lote_dim_aseguradora(conn, df_asg):
+    """Inserta/actualiza un bloque de dim_aseguradora. Retorna registros nuevos"""
+    bloque = pd.DataFrame({
+        'aseguradora_nk': df_asg['Codigo Sistema'].astype(str).str.strip(),
+        'aseguradora': df_asg['Aseguradora'].astype(str).str.strip()
+    })
+    return cargar_bloque(conn, 'dim_aseguradora', bloque)
+
 def poblar_dim_aseguradora(conn):
     """Carga dim_aseguradora"""
     print("\n🔄 Poblando dim_aseguradora...")
-    
-    df_asg = pd.read_sql_table('stg_maestro_aseguradoras', schema='stg', con=conn)
-    contador = 0
-    
-    for _, r in df_asg.iterrows():
-        params = {
-            'aseguradora_nk': str(r.get('Codigo Sistema', '')).strip(),
-            'aseguradora': str(r.get('Aseguradora', '')).strip()
-        }
-        
-        # Verificar si existe
-        res = conn.execute(
-            text("SELECT aseguradora_id FROM dw_HHCC.dim_aseguradora WHERE aseguradora_nk = :aseguradora_nk"), 
-            params
-        ).fetchone()
-        
-        if res:
-            # Actualizar
-            conn.execute(
-                text("UPDATE dw_HHCC.dim_aseguradora SET aseguradora=:aseguradora WHERE aseguradora_nk=:aseguradora_nk"), 
-                params
-            )
-        else:
-            # Insertar
-            conn.execute(
-                text("""
-                    INSERT INTO dw_HHCC.dim_aseguradora 
-                    (aseguradora_nk, aseguradora, vigente_desde, es_actual) 
-                    VALUES (:aseguradora_nk, :aseguradora, CURRENT_DATE, TRUE)
-                """), 
-                params
-            )
-            contador += 1
-    
+    contador = cargar_lote_dim_aseguradora(conn, preparar_dim_aseguradora(conn))
     print(f"✅ dim_aseguradora: {contador} registros nuevos")
 
+def preparar_dim_paciente(conn):
+    """Lee stg_maestro_pacientes"""
+    return backend_para(conn).leer_staging(conn, 'stg_maestro_pacientes')
+
+def cargar_lote_dim_paciente(conn, df_pac):
+    """Inserta/actualiza un bloque de dim_paciente. Retorna registros nuevos"""
+    bloque = pd.DataFrame({
+        'documento_paciente': df_pac['Identificacion'].astype(str).str.strip(),
+        'nombre': df_pac['Nombre'],
+        'municipio': df_pac['Municipio'],
+        'estado': df_pac['Nombre Estado'],
+        'aseguradora': df_pac['Aseguradora'],
+        'zona': df_pac['Zona'],
+        'fecha_ingreso': df_pac['Fecha Ingreso']
+    })
+    return cargar_bloque(conn, 'dim_paciente', bloque)
+
 def poblar_dim_paciente(conn):
     """Carga dim_paciente"""
     print("\n🔄 Poblando dim_paciente...")
-    
-    df_pac = pd.read_sql_table('stg_maestro_pacientes', schema='stg', con=conn)
-    contador = 0
-    
-    for _, r in df_pac.iterrows():
-        params = {
-            'documento_paciente': str(r['Identificacion']).strip(),
-            'nombre': r.get('Nombre'),
-            'municipio': r.get('Municipio'),
-            'estado': r.get('Nombre Estado'),
-            'aseguradora': r.get('Aseguradora'),
-            'zona': r.get('Zona'),
-            'fecha_ingreso': r.get('Fecha Ingreso')
-        }
-        
-        res = conn.execute(
-            text("SELECT paciente_id FROM dw_HHCC.dim_paciente WHERE documento_paciente = :documento_paciente"), 
-            {'documento_paciente': params['documento_paciente']}
-        ).fetchone()
-        
-        if res:
-            conn.execute(text("""
-                UPDATE dw_HHCC.dim_paciente
-                SET nombre=:nombre, municipio=:municipio, estado=:estado, 
-                    aseguradora=:aseguradora, zona=:zona, fecha_ingreso=:fecha_ingreso
-                WHERE documento_paciente=:documento_paciente
-            """), params)
-        else:
-            conn.execute(text("""
-                INSERT INTO dw_HHCC.dim_paciente 
-                (documento_paciente, nombre, municipio, estado, aseguradora, zona, 
-                 fecha_ingreso, vigente_desde, es_actual)
-                VALUES (:documento_paciente, :nombre, :municipio, :estado, 
-                        :aseguradora, :zona, :fecha_ingreso, CURRENT_DATE, TRUE)
-            """), params)
-            contador += 1
-    
+    contador = cargar_lote_dim_paciente(conn, preparar_dim_paciente(conn))
     print(f"✅ dim_paciente: {contador} registros nuevos")
 
-def poblar_dim_equipo_scd2(conn):
-    """Carga dim_equipo con SCD Tipo 2"""
-    print("\n🔄 Poblando dim_equipo (SCD Tipo 2)...")
+def preparar_dim_equipo(conn):
+    """
+    Lee y normaliza stg_maestro_equipos (una fila por equipo)
     
-    df_equipo = pd.read_sql_table('stg_maestro_equipos', schema='stg', con=conn)
+    Si un equipo se repite en el maestro gana la última fila. Se colapsa
+    aquí, antes de partir en lotes, para que el historial SCD2 no dependa
+    del modo de carga ni del tamaño de lote.
+    """
+    df_equipo = backend_para(conn).leer_staging(conn, 'stg_maestro_equipos')
     
     # Normalizar
     df_equipo['equipo_nk'] = df_equipo['Código Interno'].astype(str).str.strip()
     df_equipo['equipo'] = df_equipo['Nombre Equipo'].astype(str).str.strip()
     df_equipo['estado_equipo'] = df_equipo['EQUIPO ACTIVO'].astype(str).str.strip()
     
-    contador = 0
-    
-    for _, row in df_equipo[['equipo_nk', 'equipo', 'estado_equipo']].drop_duplicates().iterrows():
-        params = {
-            'equipo_nk': row['equipo_nk'], 
-            'equipo': row['equipo'], 
-            'estado_equipo': row['estado_equipo']
-        }
-        
-        # Cerrar versión anterior si cambió
-        conn.execute(text("""
-            UPDATE dw_HHCC.dim_equipo
-            SET es_actual = FALSE, vigente_hasta = CURRENT_DATE
-            WHERE equipo_nk = :equipo_nk AND es_actual = TRUE
-            AND (TRIM(UPPER(equipo)) <> TRIM(UPPER(:equipo)) 
-                 OR TRIM(UPPER(estado_equipo)) <> TRIM(UPPER(:estado_equipo)))
-        """), params)
-        
-        # Insertar nueva versión si no existe
-        conn.execute(text("""
-            INSERT INTO dw_HHCC.dim_equipo (equipo_nk, equipo, estado_equipo, vigente_desde, es_actual)
-            SELECT :equipo_nk, :equipo, :estado_equipo, CURRENT_DATE, TRUE
-            WHERE NOT EXISTS (
-                SELECT 1 FROM dw_HHCC.dim_equipo
-                WHERE equipo_nk = :equipo_nk AND es_actual = TRUE
-                AND TRIM(UPPER(equipo)) = TRIM(UPPER(:equipo))
-                AND TRIM(UPPER(estado_equipo)) = TRIM(UPPER(:estado_equipo))
-            )
-        """), params)
-        contador += 1
-    
+    return (df_equipo[['equipo_nk', 'equipo', 'estado_equipo']]
+            .drop_duplicates(subset=['equipo_nk'], keep='last')
+            .reset_index(drop=True))
+
+def cargar_lote_dim_equipo_scd2(conn, df_equipo):
+    """Aplica SCD Tipo 2 a un bloque de dim_equipo. Retorna registros procesados"""
+    return cargar_bloque(conn, 'dim_equipo', df_equipo)
+
+def poblar_dim_equipo_scd2(conn):
+    """Carga dim_equipo con SCD Tipo 2"""
+    print("\n🔄 Poblando dim_equipo (SCD Tipo 2)...")
+    contador = cargar_lote_dim_equipo_scd2(conn, preparar_dim_equipo(conn))
     print(f"✅ dim_equipo: {contador} registros procesados")
 
-def poblar_dim_pedido(conn):
-    """Carga dim_pedido"""
-    print("\n🔄 Poblando dim_pedido...")
-    
-    df_pedido = pd.read_sql_table('stg_pedidos', schema='stg', con=conn)
-    
-    # Normalizar
-    df_pedido.rename(columns={
+def normalizar_pedidos(df_pedido):
+    """Renombra y normaliza columnas de pedidos (staging o archivo fuente)"""
+    df_pedido = df_pedido.rename(columns={
         'Numero Pedido': 'numero_pedido',
         'Insumo Solicitado': 'insumo_solicitado',
         'Cantidad': 'cantidad'
-    }, inplace=True)
+    })
     
     df_pedido['insumo_solicitado'] = df_pedido['insumo_solicitado'].astype(str).str.strip().str[:255]
     df_pedido['numero_pedido'] = df_pedido['numero_pedido'].astype(str).str.strip()
     df_pedido['cantidad'] = pd.to_numeric(df_pedido['cantidad'], errors='coerce').fillna(0)
     
-    contador = 0
-    
-    for _, row in df_pedido.iterrows():
-        insert_sql = """
-        INSERT INTO dw_hhcc.dim_pedido (numero_pedido, insumo_solicitado, cantidad)
-        VALUES (:numero_pedido, :insumo_solicitado, :cantidad)
-        ON CONFLICT (numero_pedido) DO UPDATE
-        SET insumo_solicitado = EXCLUDED.insumo_solicitado,
-            cantidad = EXCLUDED.cantidad
-        """
-        conn.execute(text(insert_sql), row.to_dict())
-        contador += 1
+    return df_pedido
+
+def preparar_dim_pedido(conn):
+    """
+    Lee, normaliza y deduplica stg_pedidos por bloques
     
+    Si un numero_pedido se repite gana la última fila, igual que con el
+    upsert fila a fila, pero cada pedido se escribe una sola vez. Retorna el
+    DeduplicadorExterno con las particiones en disco (el llamador lo cierra)
+    para cargarlas de a una sin juntar todos los pedidos en memoria.
+    """
+    dedup = DeduplicadorExterno('numero_pedido')
+    try:
+        for bloque in backend_para(conn).leer_staging(conn, 'stg_pedidos', chunksize=FILAS_POR_BLOQUE):
+            dedup.agregar(normalizar_pedidos(bloque))
+    except Exception:
+        dedup.cerrar()
+        raise
+    return dedup
+
+def cargar_lote_dim_pedido(conn, df_pedido):
+    """Upsert de un bloque de dim_pedido. Retorna registros procesados"""
+    return cargar_bloque(conn, 'dim_pedido', df_pedido)
+
+def poblar_dim_pedido(conn):
+    """Carga dim_pedido"""
+    print("\n🔄 Poblando dim_pedido...")
+    contador = 0
+    with preparar_dim_pedido(conn) as dedup:
+        for parte in dedup.particiones_deduplicadas():
+            contador += cargar_lote_dim_pedido(conn, parte)
+    informar_duplicados('dim_pedido', dedup)
     print(f"✅ dim_pedido: {contador} registros procesados")
 
+def normalizar_medicamentos(df_med):
+    """Normaliza columnas del maestro de medicamentos (staging o archivo fuente)"""
+    df_med = df_med.copy()
+    df_med['nombre'] = df_med['nombre'].astype(str).str.strip().str[:255]
+    df_med['forma_farmaceutica'] = df_med['forma_farmaceutica'].astype(str).str.strip().str[:100]
+    df_med['via_administracion'] = df_med['via_administracion'].astype(str).str.strip().str[:100]
+    
+    return df_med
+
+def preparar_dim_medicamento(conn):
+    """Lee y normaliza stg_maestro_medicamentos"""
+    return normalizar_medicamentos(backend_para(conn).leer_staging(conn, 'stg_maestro_medicamentos'))
+
+def cargar_lote_dim_medicamento(conn, df_med):
+    """Upsert de un bloque de dim_medicamento. Retorna registros procesados"""
+    return cargar_bloque(conn, 'dim_medicamento', df_med)
+
 def poblar_dim_medicamento(conn):
     """Carga dim_medicamento"""
     print("\n🔄 Poblando dim_medicamento...")
+    contador = cargar_lote_dim_medicamento(conn, preparar_dim_medicamento(conn))
+    print(f"✅ dim_medicamento: {contador} registros procesados")
+
+# Orden de carga: (nombre, preparar, cargar_lote, descripción del contador)
+DIMENSIONES = [
+    ('dim_aseguradora', preparar_dim_aseguradora, cargar_lote_dim_aseguradora, 'registros nuevos'),
+    ('dim_paciente', preparar_dim_paciente, cargar_lote_dim_paciente, 'registros nuevos'),
+    ('dim_equipo', preparar_dim_equipo, cargar_lote_dim_equipo_scd2, 'registros procesados'),
+    ('dim_pedido', preparar_dim_pedido, cargar_lote_dim_pedido, 'registros procesados'),
+    ('dim_medicamento', preparar_dim_medicamento, cargar_lote_dim_medicamento, 'registros procesados')
+]
+
+# ==============================
+# ÍNDICES Y PLANES
+# ==============================
+def preparar_indices(engine):
+    """
+    Crea los índices de INDICES_DW y avisa si alguna sentencia de carga
+    todavía leería completa una tabla del DW
+    """
+    print("\n🗂️  Verificando índices...")
+    backend = backend_para(engine)
+    fallidos = backend.asegurar_indices(engine)
     
-    df_med = pd.read_sql_table('stg_maestro_medicamentos', schema='stg', con=conn)
+    if not backend.verifica_planes:
+        print(f"✅ Índices listos ({backend.dialecto}: sin revisión de planes)")
+        return
     
-    # Normalizar
-    df_med['nombre'] = df_med['nombre'].astype(str).str.strip().str[:255]
-    df_med['forma_farmaceutica'] = df_med['forma_farmaceutica'].astype(str).str.strip().str[:100]
-    df_med['via_administracion'] = df_med['via_administracion'].astype(str).str.strip().str[:100]
+    cargas = [(tipo, dimension, clave, columnas, opciones)
+              for dimension, (tipo, clave, columnas, opciones) in CARGAS.items()]
+    avisos = backend.verificar_planes(engine, cargas)
+    for tabla, tipo, linea in avisos:
+        print(f"⚠️  {tabla} ({tipo}): lectura secuencial → {linea}")
     
-    contador = 0
+    if not avisos and not fallidos:
+        print("✅ Índices listos: ninguna sentencia de carga lee tablas completas")
+
+# ==============================
+# CARGA POR LOTES (REANUDABLE)
+# ==============================
+TABLA_PROGRESO = 'etl_progreso_dimensiones'
+
+def crear_tabla_progreso(engine):
+    """Crea la tabla de marcadores de progreso si no existe"""
+    tabla = backend_para(engine).tabla_stg(TABLA_PROGRESO)
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {tabla} (
+                dimension VARCHAR(100) PRIMARY KEY,
+                huella VARCHAR(64) NOT NULL,
+                filas_confirmadas INTEGER NOT NULL,
+                actualizado TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+
+def informar_duplicados(dimension, dedup):
+    """Muestra las filas colapsadas por un DeduplicadorExterno ya recorrido"""
+    if dedup.duplicados:
+        print(f"   🧹 {dimension}: {dedup.duplicados:,} filas repetidas colapsadas")
+
+@contextmanager
+def bloques_preparados(engine, dimension, preparar):
+    """
+    Entrega una función que recorre lo preparado de una dimensión por bloques
     
-    for _, row in df_med.iterrows():
-        insert_sql = """
-        INSERT INTO dw_hhcc.dim_medicamento (codigo, nombre, forma_farmaceutica, via_administracion)
-        VALUES (:codigo, :nombre, :forma_farmaceutica, :via_administracion)
-        ON CONFLICT (codigo) DO UPDATE
-        SET nombre = EXCLUDED.nombre,
-            forma_farmaceutica = EXCLUDED.forma_farmaceutica,
-            via_administracion = EXCLUDED.via_administracion
-        """
-        conn.execute(text(insert_sql), row.to_dict())
-        contador += 1
+    preparar retorna un DataFrame (un solo bloque) o un DeduplicadorExterno
+    (un bloque por partición). La función se puede llamar más de una vez: el
+    orden de los bloques y de sus filas es siempre el mismo.
+    """
+    with engine.connect() as conn:
+        preparado = preparar(conn)
     
-    print(f"✅ dim_medicamento: {contador} registros procesados")
+    if isinstance(preparado, DeduplicadorExterno):
+        with preparado:
+            yield preparado.particiones_deduplicadas
+        informar_duplicados(dimension, preparado)
+    else:
+        yield lambda: [preparado]
+
+def huella_bloques(bloques):
+    """
+    Huella del contenido preparado de una dimensión
+    
+    Si staging cambia entre corridas, la huella cambia y la dimensión se
+    vuelve a cargar desde la fila 0 en lugar de reanudar. Depende del orden
+    de las filas, porque la reanudación es por posición.
+    
+    Returns:
+        tuple: (huella, total de filas)
+    """
+    digest, total = hashlib.sha1(), 0
+    for bloque in bloques:
+        digest.update(pd.util.hash_pandas_object(bloque, index=False).to_numpy().tobytes())
+        total += len(bloque)
+    return f"{total}:{digest.hexdigest()}", total
+
+def leer_progreso(conn, dimension, huella):
+    """Retorna las filas ya confirmadas para la dimensión (0 si no hay marcador válido)"""
+    tabla = backend_para(conn).tabla_stg(TABLA_PROGRESO)
+    res = conn.execute(
+        text(f"SELECT huella, filas_confirmadas FROM {tabla} WHERE dimension = :dimension"),
+        {'dimension': dimension}
+    ).fetchone()
+    if res and res[0] == huella:
+        return res[1]
+    return 0
+
+def guardar_progreso(conn, dimension, huella, filas_confirmadas):
+    """Actualiza el marcador dentro de la misma transacción que el lote"""
+    tabla = backend_para(conn).tabla_stg(TABLA_PROGRESO)
+    conn.execute(text(f"""
+        INSERT INTO {tabla} (dimension, huella, filas_confirmadas, actualizado)
+        VALUES (:dimension, :huella, :filas_confirmadas, CURRENT_TIMESTAMP)
+        ON CONFLICT (dimension) DO UPDATE
+        SET huella = EXCLUDED.huella,
+            filas_confirmadas = EXCLUDED.filas_confirmadas,
+            actualizado = EXCLUDED.actualizado
+    """), {'dimension': dimension, 'huella': huella, 'filas_confirmadas': filas_confirmadas})
+
+def limpiar_progreso(engine):
+    """Elimina los marcadores al terminar la carga completa"""
+    tabla = backend_para(engine).tabla_stg(TABLA_PROGRESO)
+    with engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {tabla}"))
+
+def poblar_por_lotes(engine, dimension, preparar, cargar_lote, descripcion, tamano_lote):
+    """
+    Carga una dimensión confirmando cada `tamano_lote` filas
+    
+    Cada lote y su marcador de progreso se confirman en la misma transacción,
+    así que tras una falla la siguiente corrida reanuda desde el último lote
+    confirmado. Los upserts y el SCD2 son idempotentes, por lo que repetir un
+    lote no confirmado no duplica datos.
+    
+    Args:
+        engine: SQLAlchemy engine
+        dimension (str): Nombre de la dimensión (clave del marcador)
+        preparar: Función que retorna lo preparado (ver bloques_preparados)
+        cargar_lote: Función que carga un bloque y retorna el contador
+        descripcion (str): Texto del contador para el resumen
+        tamano_lote (int): Filas por transacción
+    """
+    print(f"\n🔄 Poblando {dimension} (lotes de {tamano_lote:,})...")
+    
+    with bloques_preparados(engine, dimension, preparar) as bloques:
+        huella, total = huella_bloques(bloques())
+        with engine.connect() as conn:
+            inicio = leer_progreso(conn, dimension, huella)
+        
+        if inicio >= total and total > 0:
+            print(f"⏭️  {dimension}: ya confirmada en una corrida anterior")
+            return
+        if inicio > 0:
+            print(f"   ↪️  Reanudando desde la fila {inicio:,} de {total:,}")
+        
+        # Los lotes no cruzan bloques; la posición confirmada es global
+        contador, posicion = 0, 0
+        for bloque in bloques():
+            for desde in range(max(inicio - posicion, 0), len(bloque), tamano_lote):
+                hasta = min(desde + tamano_lote, len(bloque))
+                with engine.begin() as conn:
+                    contador += cargar_lote(conn, bloque.iloc[desde:hasta])
+                    guardar_progreso(conn, dimension, huella, posicion + hasta)
+            posicion += len(bloque)
+    
+    print(f"✅ {dimension}: {contador} {descripcion}")
 
 # ==============================
 # MAIN
 # ==============================
-def main():
-    """Ejecuta el ETL completo de dimensiones"""
+def main(modo=None, tamano_lote=None):
+    """
+    Ejecuta el ETL completo de dimensiones
+    
+    Args:
+        modo (str): 'transaccion' (todas las dimensiones en una sola
+            transacción) o 'lotes' (commits cada `tamano_lote` filas,
+            reanudable). Por defecto MODO_CARGA o 'transaccion'.
+        tamano_lote (int): Filas por commit en modo 'lotes'
+    """
+    modo = modo or MODO_CARGA
+    tamano_lote = tamano_lote or TAMANO_LOTE
+    
     print("="*60)
     print("ETL DE DIMENSIONES")
     print("="*60)
     
     try:
         # Obtener engine
-        engine = get_engine()
+        engine = obtener_engine()
+        instrumentar(engine)
+        backend = backend_para(engine)
+        print(f"🗄️  Destino: {backend.dialecto}")
+        
+        # En destinos locales se crea la estructura mínima del DW
+        if not isinstance(backend, BackendPostgres):
+            with engine.begin() as conn:
+                backend.crear_tablas_dw(conn)
+        
+        # Índices de las sentencias de carga y revisión de planes
+        with etapa('preparar_indices'):
+            preparar_indices(engine)
         
         # Leer archivos
-        archivos = leer_archivos()
+        with etapa('leer_archivos'):
+            archivos = leer_archivos()
         
         # Cargar staging
-        cargar_staging(archivos, engine)
+        with etapa('cargar_staging'):
+            cargar_staging(archivos, engine)
         
         # Poblar dimensiones
-        with engine.begin() as conn:
-            poblar_dim_aseguradora(conn)
-            poblar_dim_paciente(conn)
-            poblar_dim_equipo_scd2(conn)
-            poblar_dim_pedido(conn)
-            poblar_dim_medicamento(conn)
+        if modo == 'lotes':
+            crear_tabla_progreso(engine)
+            for dimension, preparar, cargar_lote, descripcion in DIMENSIONES:
+                with etapa(f'poblar_{dimension}'):
+                    poblar_por_lotes(engine, dimension, preparar, cargar_lote, descripcion, tamano_lote)
+            limpiar_progreso(engine)
+        elif modo == 'transaccion':
+            with engine.begin() as conn:
+                for poblar in [poblar_dim_aseguradora, poblar_dim_paciente, poblar_dim_equipo_scd2,
+                               poblar_dim_pedido, poblar_dim_medicamento]:
+                    with etapa(poblar.__name__):
+                        poblar(conn)
+        else:
+            raise ValueError(f"Modo de carga desconocido: {modo} (use 'transaccion' o 'lotes')")
         
         print("\n" + "="*60)
         print("✅ ETL DE DIMENSIONES COMPLETADO")
@@ -395,6 +546,23 @@ def main():
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        finalizar()
+
+def parsear_argumentos(argv=None):
+    """Lee --lotes [N] de la línea de comandos"""
+    argv = sys.argv[1:] if argv is None else argv
+    modo, tamano_lote = None, None
+    for i, arg in enumerate(argv):
+        if arg == '--lotes':
+            modo = 'lotes'
+            if i + 1 < len(argv) and argv[i + 1].isdigit():
+                tamano_lote = int(argv[i + 1])
+        elif arg == '--transaccion':
+            modo = 'transaccion'
+    return modo, tamano_lote
 
 if __name__ == "__main__":
-    main()
+    # --profile[=directorio]: flamegraphs por etapa y estadísticas SQL
+    activar_desde_argv()
+    main(*parsear_argumentos())
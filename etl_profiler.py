@@ -0,0 +1,348 @@
+"""
+Perfilado de Corridas (--profile)
+Autor: Data Team
+Descripción: Modo opcional para diagnosticar corridas lentas sin editar
+             código ni usar cProfile a mano. Al activarlo:
+             - Un hilo muestrea la pila del proceso cada INTERVALO_MUESTREO
+               segundos y escribe por etapa un archivo en formato "folded"
+               (compatible con flamegraph.pl y speedscope)
+             - Eventos de SQLAlchemy cuentan cada sentencia SQL por etapa y
+               arman un histograma de latencias (las que van directo al
+               cursor del driver, como COPY, se miden con medir_sql)
+
+Sin --profile todas las funciones son no-ops.
+
+Uso:
+    python etl_dimensions.py --profile               # perfiles/<script>_<fecha>/
+    python cleanup_reporte_equipos.py --profile=/tmp/perfil
+
+    flamegraph.pl perfiles/.../03_poblar_dim_paciente.folded > paciente.svg
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+
+# ===============================================================
+# CONFIGURACIÓN
+# ===============================================================
+DIR_PERFILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perfiles')
+
+# Segundos entre muestras de la pila (5 ms ≈ 200 muestras por segundo)
+INTERVALO_MUESTREO = 0.005
+
+# Límites superiores (ms) de los buckets del histograma de latencias SQL
+BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000]
+
+# Sentencias a mostrar en el resumen por consola
+TOP_SENTENCIAS = 10
+
+# ===============================================================
+# MUESTREO DE PILA
+# ===============================================================
+def _etiqueta_frame(frame):
+    codigo = frame.f_code
+    return f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})"
+
+class MuestreadorPila:
+    """
+    Muestrea periódicamente la pila de un hilo y acumula pilas colapsadas
+
+    Args:
+        id_hilo (int): Hilo a muestrear (threading.get_ident())
+        intervalo (float): Segundos entre muestras
+    """
+
+    def __init__(self, id_hilo, intervalo=INTERVALO_MUESTREO):
+        self.id_hilo = id_hilo
+        self.intervalo = intervalo
+        self.pilas = Counter()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, name='muestreador-perfil', daemon=True)
+
+    def _muestrear(self):
+        while not self._detener.wait(self.intervalo):
+            frame = sys._current_frames().get(self.id_hilo)
+            etiquetas = []
+            while frame is not None:
+                etiquetas.append(_etiqueta_frame(frame))
+                frame = frame.f_back
+            if etiquetas:
+                self.pilas[';'.join(reversed(etiquetas))] += 1
+
+    def iniciar(self):
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        self._hilo.join()
+
+    @property
+    def muestras(self):
+        return sum(self.pilas.values())
+
+    def escribir_folded(self, ruta):
+        """Una línea por pila: 'raiz;...;hoja cantidad'"""
+        with open(ruta, 'w', encoding='utf-8') as f:
+            for pila, cantidad in self.pilas.most_common():
+                f.write(f"{pila} {cantidad}\n")
+
+# ===============================================================
+# ESTADÍSTICAS SQL
+# ===============================================================
+def normalizar_sentencia(sql):
+    """Colapsa espacios para agrupar la misma sentencia con distinto formato"""
+    return re.sub(r'\s+', ' ', sql).strip()
+
+class EstadisticaSentencia:
+    """Conteo, tiempo total e histograma de una sentencia"""
+
+    def __init__(self):
+        self.ejecuciones = 0
+        self.total_ms = 0.0
+        self.maximo_ms = 0.0
+        self.histograma = [0] * (len(BUCKETS_MS) + 1)
+
+    def registrar(self, ms):
+        self.ejecuciones += 1
+        self.total_ms += ms
+        self.maximo_ms = max(self.maximo_ms, ms)
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        self.histograma[i] += 1
+
+    @property
+    def promedio_ms(self):
+        return self.total_ms / self.ejecuciones if self.ejecuciones else 0.0
+
+    def percentil_ms(self, p):
+        """Límite superior del bucket que contiene el percentil p (0-100)"""
+        objetivo = self.ejecuciones * p / 100
+        acumulado = 0
+        for limite, cantidad in zip(BUCKETS_MS + [float('inf')], self.histograma):
+            acumulado += cantidad
+            if acumulado >= objetivo:
+                return limite if limite != float('inf') else self.maximo_ms
+        return self.maximo_ms
+
+    def histograma_texto(self):
+        etiquetas = [f"≤{b}" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}"]
+        return ' '.join(f"{e}:{n}" for e, n in zip(etiquetas, self.histograma) if n)
+
+# ===============================================================
+# PERFILADOR
+# ===============================================================
+class Perfilador:
+    """
+    Agrupa muestras de pila y estadísticas SQL por etapa
+
+    Args:
+        dir_salida (str): Directorio donde se escriben los perfiles
+        intervalo (float): Segundos entre muestras de pila
+    """
+
+    def __init__(self, dir_salida, intervalo=INTERVALO_MUESTREO):
+        self.dir_salida = dir_salida
+        self.intervalo = intervalo
+        os.makedirs(dir_salida, exist_ok=True)
+        self.sql = defaultdict(lambda: defaultdict(EstadisticaSentencia))
+        self.etapas = []
+        self._etapa_actual = None
+        self._muestreador = None
+        self._inicio_etapa = None
+        self._engines = []
+        self._local = threading.local()
+
+    # --- Etapas ---
+    def iniciar_etapa(self, nombre):
+        """Cierra la etapa en curso (si hay) y empieza a muestrear `nombre`"""
+        self.terminar_etapa()
+        self._etapa_actual = nombre
+        self._inicio_etapa = time.perf_counter()
+        self._muestreador = MuestreadorPila(threading.get_ident(), self.intervalo)
+        self._muestreador.iniciar()
+
+    def terminar_etapa(self):
+        """Detiene el muestreo de la etapa en curso y escribe su archivo .folded"""
+        if self._etapa_actual is None:
+            return
+        self._muestreador.detener()
+        duracion = time.perf_counter() - self._inicio_etapa
+        nombre = self._etapa_actual
+        archivo = f"{len(self.etapas) + 1:02d}_{re.sub(r'[^A-Za-z0-9_.-]+', '_', nombre)}.folded"
+        self._muestreador.escribir_folded(os.path.join(self.dir_salida, archivo))
+
+        sentencias = sum(e.ejecuciones for e in self.sql[nombre].values())
+        self.etapas.append((nombre, duracion, self._muestreador.muestras, sentencias, archivo))
+        print(f"⏱️  [perfil] {nombre}: {duracion:.2f}s, {self._muestreador.muestras:,} muestras, "
+              f"{sentencias:,} sentencias SQL")
+        self._etapa_actual = None
+        self._muestreador = None
+
+    @contextmanager
+    def etapa(self, nombre):
+        """Perfila el bloque como una etapa (las etapas no se anidan)"""
+        self.iniciar_etapa(nombre)
+        try:
+            yield
+        finally:
+            self.terminar_etapa()
+
+    # --- SQL ---
+    def instrumentar(self, engine):
+        """Registra los eventos de SQLAlchemy que miden cada sentencia del engine"""
+        from sqlalchemy import event
+
+        if engine in self._engines:
+            return
+        event.listen(engine, 'before_cursor_execute', self._antes_sql)
+        event.listen(engine, 'after_cursor_execute', self._despues_sql)
+        self._engines.append(engine)
+
+    def _antes_sql(self, conn, cursor, sentencia, parametros, contexto, executemany):
+        self._local.inicio = time.perf_counter()
+
+    def _despues_sql(self, conn, cursor, sentencia, parametros, contexto, executemany):
+        inicio = getattr(self._local, 'inicio', None)
+        if inicio is None:
+            return
+        self.registrar_sql(sentencia, (time.perf_counter() - inicio) * 1000, executemany)
+
+    def registrar_sql(self, sentencia, ms, executemany=False):
+        """Suma una ejecución de la sentencia a la etapa en curso"""
+        clave = normalizar_sentencia(sentencia)
+        if executemany:
+            clave = f"[executemany] {clave}"
+        self.sql[self._etapa_actual or 'sin etapa'][clave].registrar(ms)
+
+    @contextmanager
+    def medir_sql(self, sentencia):
+        """Mide un bloque que ejecuta `sentencia` sin pasar por los eventos de SQLAlchemy"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar_sql(sentencia, (time.perf_counter() - inicio) * 1000)
+
+    # --- Reporte ---
+    def escribir_reporte_sql(self):
+        """Escribe sql_estadisticas.txt con todas las sentencias por etapa"""
+        ruta = os.path.join(self.dir_salida, 'sql_estadisticas.txt')
+        with open(ruta, 'w', encoding='utf-8') as f:
+            for etapa, sentencias in self.sql.items():
+                f.write(f"=== {etapa} ===\n")
+                ordenadas = sorted(sentencias.items(), key=lambda kv: kv[1].total_ms, reverse=True)
+                for sql, e in ordenadas:
+                    f.write(f"{e.ejecuciones:>8,} × prom {e.promedio_ms:8.2f} ms  p95 ≤{e.percentil_ms(95):>6} ms  "
+                            f"máx {e.maximo_ms:8.2f} ms  total {e.total_ms / 1000:8.2f} s\n")
+                    f.write(f"         histograma (ms) {e.histograma_texto()}\n")
+                    f.write(f"         {sql}\n\n")
+        return ruta
+
+    def finalizar(self):
+        """Cierra la etapa en curso, quita los eventos y muestra el resumen"""
+        from sqlalchemy import event
+
+        self.terminar_etapa()
+        for engine in self._engines:
+            event.remove(engine, 'before_cursor_execute', self._antes_sql)
+            event.remove(engine, 'after_cursor_execute', self._despues_sql)
+        self._engines = []
+
+        print("\n" + "="*60)
+        print("PERFIL DE LA CORRIDA")
+        print("="*60)
+        for nombre, duracion, muestras, sentencias, archivo in self.etapas:
+            print(f"{nombre:<35} {duracion:>9.2f}s  {sentencias:>8,} SQL  → {archivo}")
+
+        if self.sql:
+            print(f"\nSentencias SQL más costosas (top {TOP_SENTENCIAS}):")
+            todas = [(etapa, sql, e) for etapa, sentencias in self.sql.items() for sql, e in sentencias.items()]
+            for etapa, sql, e in sorted(todas, key=lambda t: t[2].total_ms, reverse=True)[:TOP_SENTENCIAS]:
+                print(f"  {etapa}: {e.ejecuciones:,} × {e.promedio_ms:.2f} ms = {e.total_ms / 1000:.2f}s  "
+                      f"{sql[:80]}{'...' if len(sql) > 80 else ''}")
+            print(f"\n📄 Detalle SQL: {self.escribir_reporte_sql()}")
+        print(f"🔥 Flamegraphs (.folded) en: {self.dir_salida}")
+
+# ===============================================================
+# API DEL MÓDULO (no-ops sin --profile)
+# ===============================================================
+_PERFILADOR = None
+
+def activar(dir_salida=None, intervalo=INTERVALO_MUESTREO):
+    """
+    Activa el perfilado para el resto del proceso
+
+    Args:
+        dir_salida (str): Directorio de salida (por defecto perfiles/<script>_<fecha>)
+        intervalo (float): Segundos entre muestras de pila
+
+    Returns:
+        Perfilador: Instancia activa
+    """
+    global _PERFILADOR
+    if dir_salida is None:
+        script = os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0]
+        dir_salida = os.path.join(DIR_PERFILES, f"{re.sub(r'[^A-Za-z0-9_-]+', '_', script)}_{time.strftime('%Y%m%d_%H%M%S')}")
+    _PERFILADOR = Perfilador(dir_salida, intervalo)
+    print(f"🔬 Perfilado activo → {dir_salida}")
+    return _PERFILADOR
+
+def activo():
+    return _PERFILADOR is not None
+
+def perfil_desde_argv(argv=None):
+    """
+    Lee --profile o --profile=<directorio> de la línea de comandos
+
+    Returns:
+        tuple: (activar, directorio o None)
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    for arg in argv:
+        if arg == '--profile':
+            return True, None
+        if arg.startswith('--profile='):
+            return True, arg.split('=', 1)[1]
+    return False, None
+
+def activar_desde_argv(argv=None):
+    """Activa el perfilado si la línea de comandos trae --profile"""
+    pedir, dir_salida = perfil_desde_argv(argv)
+    if pedir:
+        return activar(dir_salida)
+    return None
+
+def etapa(nombre):
+    """Context manager que perfila un bloque como etapa"""
+    return _PERFILADOR.etapa(nombre) if _PERFILADOR else nullcontext()
+
+def iniciar_etapa(nombre):
+    """Marca el inicio de una etapa en código secuencial (cierra la anterior)"""
+    if _PERFILADOR:
+        _PERFILADOR.iniciar_etapa(nombre)
+
+def instrumentar(engine):
+    """Mide las sentencias SQL del engine"""
+    if _PERFILADOR:
+        _PERFILADOR.instrumentar(engine)
+
+def medir_sql(sentencia):
+    """
+    Context manager que mide SQL ejecutado con el cursor del driver
+
+    Los COPY de psycopg2 (copy_expert) no disparan los eventos de
+    SQLAlchemy; sin esto no aparecerían en sql_estadisticas.txt.
+    """
+    return _PERFILADOR.medir_sql(sentencia) if _PERFILADOR else nullcontext()
+
+def finalizar():
+    """Escribe los perfiles pendientes y el resumen; desactiva el perfilado"""
+    global _PERFILADOR
+    if _PERFILADOR:
+        _PERFILADOR.finalizar()
+        _PERFILADOR = None
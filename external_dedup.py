@@ -0,0 +1,188 @@
+"""
+Deduplicación Externa por Particiones de Hash
+Autor: Data Team
+Descripción: Elimina claves repetidas de historiales que no caben en memoria.
+             Los bloques de entrada se reparten en particiones en disco según
+             el hash de la clave; como todas las filas de una misma clave caen
+             en la misma partición, cada partición se deduplica por separado
+             y solo una de ellas está en memoria a la vez.
+
+Semántica: igual que drop_duplicates(subset=clave, keep='last'). Gana la
+última fila de cada clave en el orden de entrada y el resultado conserva
+ese orden.
+
+Uso:
+    with DeduplicadorExterno('numero_pedido') as dedup:
+        for bloque in pd.read_csv(ruta, chunksize=100_000):
+            dedup.agregar(bloque)
+        for parte in dedup.particiones_deduplicadas():
+            ...                           # memoria acotada
+    print(dedup.duplicados)
+"""
+import os
+import pickle
+import shutil
+import tempfile
+
+import pandas as pd
+
+# ===============================================================
+# CONFIGURACIÓN
+# ===============================================================
+# Más particiones = menos memoria por partición (y más archivos abiertos)
+PARTICIONES = int(os.getenv('DEDUP_PARTICIONES', '64'))
+
+# Filas por bloque al leer de la fuente
+FILAS_POR_BLOQUE = 100_000
+
+_ORDEN = '__orden_dedup'
+
+# ===============================================================
+# DEDUPLICADOR
+# ===============================================================
+def _clave_canonica(bloque, clave):
+    """
+    Texto de la clave con el mismo formato en todos los bloques
+
+    read_csv infiere el dtype por bloque: el mismo id puede llegar como int64
+    en uno y float64 en otro (si el bloque trae vacíos), y su hash cambiaría
+    de partición. Los números se pasan a float64 antes de convertir a texto.
+    """
+    columnas = {}
+    for c in clave:
+        col = bloque[c]
+        if pd.api.types.is_numeric_dtype(col) and not pd.api.types.is_bool_dtype(col):
+            col = col.astype('float64')
+        columnas[c] = col.astype(str).where(col.notna(), '')
+    return pd.DataFrame(columnas)
+
+class DeduplicadorExterno:
+    """
+    Deduplica por clave usando particiones de hash en un directorio temporal
+
+    Args:
+        clave (str | list): Columna(s) que identifican la fila
+        particiones (int): Cantidad de particiones en disco
+        dir_trabajo (str): Directorio para los temporales (por defecto el del sistema)
+    """
+
+    def __init__(self, clave, particiones=PARTICIONES, dir_trabajo=None):
+        self.clave = [clave] if isinstance(clave, str) else list(clave)
+        self.particiones = particiones
+        self._dir = tempfile.mkdtemp(prefix='dedup_', dir=dir_trabajo)
+        self._archivos = [None] * particiones
+        self.filas_entrada = 0
+        self.filas_salida = None
+        self._columnas = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    @property
+    def duplicados(self):
+        """Filas colapsadas (disponible tras recorrer las particiones)"""
+        if self.filas_salida is None:
+            return None
+        return self.filas_entrada - self.filas_salida
+
+    def _ruta(self, i):
+        return os.path.join(self._dir, f'particion_{i:04d}.pkl')
+
+    def agregar(self, bloque):
+        """Reparte un bloque (en orden de llegada) entre las particiones en disco"""
+        if len(bloque) == 0:
+            return
+        bloque = bloque.reset_index(drop=True)
+        if self._columnas is None:
+            self._columnas = list(bloque.columns)
+        bloque[_ORDEN] = range(self.filas_entrada, self.filas_entrada + len(bloque))
+        self.filas_entrada += len(bloque)
+
+        numero = pd.util.hash_pandas_object(_clave_canonica(bloque, self.clave), index=False).values % self.particiones
+        for i, parte in bloque.groupby(numero, sort=False):
+            if self._archivos[i] is None:
+                self._archivos[i] = open(self._ruta(i), 'ab')
+            pickle.dump(parte, self._archivos[i], protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _leer_particion(self, i):
+        partes = []
+        with open(self._ruta(i), 'rb') as f:
+            while True:
+                try:
+                    partes.append(pickle.load(f))
+                except EOFError:
+                    break
+        return pd.concat(partes, ignore_index=True)
+
+    def _particiones_con_orden(self):
+        for archivo in self._archivos:
+            if archivo is not None:
+                archivo.close()
+
+        self.filas_salida = 0
+        for i, archivo in enumerate(self._archivos):
+            if archivo is None:
+                continue
+            # Dentro de la partición las filas ya están en orden de entrada
+            parte = self._leer_particion(i).drop_duplicates(subset=self.clave, keep='last')
+            self.filas_salida += len(parte)
+            yield parte
+
+    def particiones_deduplicadas(self):
+        """
+        Genera cada partición ya deduplicada (una a la vez en memoria)
+
+        Las claves no se repiten entre particiones; el orden es el de entrada
+        dentro de cada partición, no entre particiones.
+        """
+        for parte in self._particiones_con_orden():
+            yield parte.drop(columns=[_ORDEN])
+
+    def resultado(self):
+        """
+        Une las particiones deduplicadas en el orden de entrada
+
+        Requiere memoria para las filas únicas (no para el historial completo).
+
+        Returns:
+            DataFrame: Equivalente a drop_duplicates(subset=clave, keep='last')
+        """
+        partes = list(self._particiones_con_orden())
+        if not partes:
+            return pd.DataFrame(columns=self._columnas)
+        return (pd.concat(partes, ignore_index=True)
+                .sort_values(_ORDEN, kind='stable')
+                .drop(columns=[_ORDEN])
+                .reset_index(drop=True))
+
+    def cerrar(self):
+        """Elimina los archivos temporales"""
+        for archivo in self._archivos:
+            if archivo is not None and not archivo.closed:
+                archivo.close()
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+def deduplicar(bloques, clave, particiones=PARTICIONES, dir_trabajo=None):
+    """
+    Deduplica una secuencia de bloques quedándose con la última fila por clave
+
+    Args:
+        bloques: DataFrame o iterable de DataFrames (ej. read_csv con chunksize)
+        clave (str | list): Columna(s) clave
+        particiones (int): Particiones en disco
+        dir_trabajo (str): Directorio para los temporales
+
+    Returns:
+        tuple: (DataFrame deduplicado, filas colapsadas)
+    """
+    if isinstance(bloques, pd.DataFrame):
+        bloques = [bloques.iloc[i:i + FILAS_POR_BLOQUE] for i in range(0, len(bloques), FILAS_POR_BLOQUE)]
+
+    with DeduplicadorExterno(clave, particiones, dir_trabajo) as dedup:
+        for bloque in bloques:
+            dedup.agregar(bloque)
+        df = dedup.resultado()
+    return df, dedup.duplicados
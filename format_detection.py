@@ -0,0 +1,177 @@
+"""
+Detección de Formato de Archivos CSV
+Autor: Data Team
+Descripción: Detecta encoding y separador de un CSV leyendo un único bloque
+             de bytes del inicio del archivo (si ese bloque es solo ASCII,
+             el encoding se decide con el primer tramo no ASCII que siga).
+             El resultado se guarda en caché por huella del archivo (ruta, tamaño, fecha de modificación), de
+             modo que cada archivo se inspecciona una sola vez por proceso y
+             los lectores pueden usar el parser C de pandas con `sep` y
+             `encoding` conocidos en lugar de `sep=None` (parser python).
+"""
+import codecs
+import os
+from collections import Counter
+
+# ===============================================================
+# CONFIGURACIÓN
+# ===============================================================
+# Bytes leídos del inicio del archivo para decidir el formato
+TAMANO_MUESTRA = 64 * 1024
+
+# Separadores candidatos, en orden de preferencia ante empate
+SEPARADORES = [';', ',', '\t', '|']
+
+# Marcas de orden de bytes (BOM) → encoding que las descarta al leer
+BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+# Bytes sin carácter asignado en windows-1252
+_NO_DEFINIDOS_CP1252 = {0x81, 0x8D, 0x8F, 0x90, 0x9D}
+
+_CACHE = {}
+
+# ===============================================================
+# DETECCIÓN
+# ===============================================================
+def detectar_encoding(muestra):
+    """
+    Decide el encoding a partir de una muestra de bytes
+
+    Orden: BOM → UTF-8 válido → windows-1252 (si usa sus caracteres
+    0x80-0x9F, p. ej. comillas tipográficas) → latin1.
+
+    Args:
+        muestra (bytes): Primeros bytes del archivo
+
+    Returns:
+        str: Nombre del encoding para open()/pandas
+    """
+    for bom, encoding in BOMS:
+        if muestra.startswith(bom):
+            return encoding
+
+    # final=False tolera un carácter multibyte cortado al final del bloque
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(muestra, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    altos = {b for b in muestra if 0x80 <= b <= 0x9F}
+    if altos and not (altos & _NO_DEFINIDOS_CP1252):
+        return 'windows-1252'
+    return 'latin1'
+
+def _primer_tramo_no_ascii(f, tamano_bloque):
+    """
+    Avanza por el archivo hasta el primer byte no ASCII y retorna el tramo
+    que empieza en él (b'' si todo el resto es ASCII)
+
+    Como todo lo anterior es ASCII, ese byte inicia un carácter: el tramo se
+    puede decodificar sin cortar secuencias UTF-8 al comienzo.
+    """
+    while True:
+        bloque = f.read(tamano_bloque)
+        if not bloque:
+            return b''
+        if not bloque.isascii():
+            inicio = next(i for i, b in enumerate(bloque) if b >= 0x80)
+            return bloque[inicio:] + f.read(inicio)
+
+def _lineas_sin_comillas(texto):
+    """Separa el texto en líneas lógicas ignorando lo que va entre comillas"""
+    lineas, actual, en_comillas = [], [], False
+    for c in texto:
+        if c == '"':
+            en_comillas = not en_comillas
+        elif c == '\n' and not en_comillas:
+            lineas.append(''.join(actual))
+            actual = []
+        elif not en_comillas:
+            actual.append(c)
+    if actual:
+        lineas.append(''.join(actual))
+    return lineas
+
+def detectar_separador(texto, separadores=SEPARADORES):
+    """
+    Elige el separador que aparece un número constante de veces por línea
+
+    Para cada candidato se toma la cantidad de apariciones más frecuente
+    entre las líneas completas de la muestra; gana el que tiene esa cantidad
+    en más líneas (y, a igualdad, más columnas).
+
+    Args:
+        texto (str): Muestra decodificada
+        separadores (list): Candidatos
+
+    Returns:
+        str: Separador detectado
+    """
+    lineas = [l for l in _lineas_sin_comillas(texto) if l.strip()]
+
+    mejor, mejor_puntaje = separadores[0], (0, 0)
+    for sep in separadores:
+        conteos = Counter(linea.count(sep) for linea in lineas)
+        cantidad, lineas_consistentes = max(
+            ((c, n) for c, n in conteos.items() if c > 0),
+            key=lambda par: (par[1], par[0]),
+            default=(0, 0)
+        )
+        puntaje = (lineas_consistentes, cantidad)
+        if puntaje > mejor_puntaje:
+            mejor, mejor_puntaje = sep, puntaje
+    return mejor
+
+def huella_archivo(ruta):
+    """Clave de caché: ruta absoluta, tamaño y fecha de modificación"""
+    info = os.stat(ruta)
+    return (os.path.abspath(ruta), info.st_size, info.st_mtime_ns)
+
+def detectar_formato(ruta, tamano_muestra=TAMANO_MUESTRA):
+    """
+    Detecta separador y encoding de un CSV en una sola lectura
+
+    Args:
+        ruta (str): Ruta al archivo CSV
+        tamano_muestra (int): Bytes a inspeccionar
+
+    Returns:
+        tuple: (separador, encoding)
+    """
+    clave = huella_archivo(ruta)
+    if clave in _CACHE:
+        return _CACHE[clave]
+
+    with open(ruta, 'rb') as f:
+        muestra = f.read(tamano_muestra)
+        completo = len(muestra) < tamano_muestra or not f.read(1)
+        # Una muestra solo ASCII no distingue UTF-8 de latin1: se decide con
+        # el primer tramo del archivo que tenga bytes no ASCII
+        if not completo and muestra.isascii():
+            f.seek(len(muestra))
+            tramo = _primer_tramo_no_ascii(f, tamano_muestra)
+        else:
+            tramo = muestra
+
+    encoding = detectar_encoding(tramo)
+    texto = codecs.getincrementaldecoder(encoding)(errors='replace').decode(muestra, final=completo)
+    texto = texto.replace('\r\n', '\n').replace('\r', '\n').lstrip('\ufeff')
+
+    # Si el bloque cortó el archivo, descartar la última línea incompleta
+    if not completo and '\n' in texto:
+        texto = texto[:texto.rindex('\n') + 1]
+
+    resultado = (detectar_separador(texto), encoding)
+    _CACHE[clave] = resultado
+    return resultado
+
+def limpiar_cache():
+    """Olvida los formatos detectados (útil en procesos de larga duración)"""
+    _CACHE.clear()
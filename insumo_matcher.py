@@ -0,0 +1,156 @@
+"""
+Índice de Catálogo para Codificación de Insumos
+Autor: Data Team
+Descripción: Normalización de nombres y matching (exacto, parcial por
+             primeras 4 palabras y fuzzy) contra el catálogo consolidado de
+             Insumos Medicos + Maestro Medicamentos. Lo usan el script de
+             limpieza de pedidos y el servicio matcher_service.py.
+"""
+import os
+import re
+import unicodedata
+from functools import lru_cache
+
+import pandas as pd
+
+try:
+    from rapidfuzz import process, fuzz
+    RAPIDFUZZ_DISPONIBLE = True
+except ImportError:
+    RAPIDFUZZ_DISPONIBLE = False
+    # Sin rapidfuzz se omite la fase fuzzy: avisar en vez de codificar menos en silencio
+    print("⚠️  rapidfuzz no disponible - solo matching exacto")
+
+# ===============================================================
+# CONFIGURACIÓN
+# ===============================================================
+UMBRAL_FUZZY = 85
+
+# Nombres normalizados distintos que guarda la caché de cada índice (LRU);
+# acota la memoria del servicio, que vive hasta la próxima recarga
+TAMANO_CACHE = int(os.getenv('MATCHER_TAMANO_CACHE', '100000'))
+
+# ===============================================================
+# 🧽 FUNCIÓN DE NORMALIZACIÓN
+# ===============================================================
+def normalizar_texto(texto):
+    if pd.isna(texto):
+        return ""
+    texto = str(texto).upper()
+    texto = ''.join(c for c in unicodedata.normalize('NFKD', texto)
+                    if not unicodedata.combining(c))
+    texto = re.sub(r'\bCMS\b', 'CM', texto)
+    texto = re.sub(r'\bMTS\b', 'MT', texto)
+    texto = re.sub(r'\bPU\b', '', texto)
+    texto = re.sub(r'\b(\d+)\s*MG\b', r'\1MG', texto)
+    texto = re.sub(r'\b(\d+)\s*ML\b', r'\1ML', texto)
+    texto = re.sub(r'\b(DE|POR|X|EL|LA|LOS|LAS|EN|CON|A|AL|INTRAMUSCULAR|INTRAVENOSA|ORAL)\b', '', texto)
+    texto = re.sub(r'[^A-Z0-9 ]+', ' ', texto)
+    texto = re.sub(r'\s+', ' ', texto)
+    return texto.strip()
+
+# ===============================================================
+# 💊 CATÁLOGO CONSOLIDADO
+# ===============================================================
+def leer_catalogo(ruta_insumos, ruta_maestro):
+    """
+    Lee y consolida los catálogos de insumos y medicamentos
+
+    Args:
+        ruta_insumos (str): Ruta a Insumos Medicos.csv
+        ruta_maestro (str): Ruta a Maestro Medicamentos.csv
+
+    Returns:
+        DataFrame: columnas codigo, nombre, nombre_norm
+    """
+    insumos = pd.read_csv(ruta_insumos, sep=';', encoding='latin1', dtype=str)
+    maestro = pd.read_csv(ruta_maestro, sep=';', encoding='latin1', dtype=str)
+
+    insumos['codigo'] = insumos['CODIGO INTERNO'].astype(str).str.replace(r'\.0$', '', regex=True)
+    insumos['nombre'] = insumos['DESCRIPCIÓN DEL INSUMO']
+    maestro['codigo'] = maestro['Código del Medicamento'].astype(str).str.replace(r'\.0$', '', regex=True)
+    maestro['nombre'] = maestro['Nombre']
+
+    consolidado = pd.concat([insumos[['codigo', 'nombre']], maestro[['codigo', 'nombre']]], ignore_index=True)
+    consolidado = consolidado[consolidado['codigo'].notna() & (consolidado['codigo'] != '') &
+                              consolidado['nombre'].notna() & (consolidado['nombre'].str.strip() != '')]
+    consolidado['nombre_norm'] = consolidado['nombre'].apply(normalizar_texto)
+    return consolidado
+
+class IndiceCatalogo:
+    """
+    Catálogo normalizado listo para codificar nombres de insumos
+
+    Precalcula las primeras 4 palabras de cada nombre del catálogo y guarda
+    en caché el resultado por nombre normalizado, de modo que un mismo
+    insumo repetido en miles de pedidos se resuelve una sola vez.
+    """
+
+    def __init__(self, consolidado, umbral_fuzzy=UMBRAL_FUZZY, tamano_cache=TAMANO_CACHE):
+        self.diccionario_codigos = consolidado.set_index('nombre_norm')['codigo'].to_dict()
+        self.nombres_consolidado = list(self.diccionario_codigos.keys())
+        self._primeras = [
+            (nombre.split()[:4], self.diccionario_codigos[nombre])
+            for nombre in self.nombres_consolidado
+        ]
+        self.umbral_fuzzy = umbral_fuzzy
+        # lru_cache es seguro entre hilos (el servicio atiende en paralelo)
+        self.codificar_normalizado = lru_cache(maxsize=tamano_cache)(self._codificar_normalizado)
+
+    @classmethod
+    def desde_archivos(cls, ruta_insumos, ruta_maestro, umbral_fuzzy=UMBRAL_FUZZY):
+        return cls(leer_catalogo(ruta_insumos, ruta_maestro), umbral_fuzzy)
+
+    def __len__(self):
+        return len(self.nombres_consolidado)
+
+    # --- Exact match ---
+    def buscar_codigo_exacto(self, nombre):
+        return self.diccionario_codigos.get(nombre)
+
+    # --- Parcial por primeras 4 palabras ---
+    def buscar_codigo_parcial(self, nombre):
+        if not nombre:
+            return None
+        for primeras, codigo in self._primeras:
+            if all(p in nombre for p in primeras):
+                return codigo
+        return None
+
+    # --- Fuzzy match último recurso ---
+    def buscar_codigo_fuzzy(self, nombre, umbral=None):
+        if not nombre or not RAPIDFUZZ_DISPONIBLE:
+            return None
+        umbral = self.umbral_fuzzy if umbral is None else umbral
+        mejor = process.extractOne(nombre, self.nombres_consolidado, scorer=fuzz.token_sort_ratio)
+        if mejor and mejor[1] >= umbral:
+            return self.diccionario_codigos[mejor[0]]
+        return None
+
+    def _codificar_normalizado(self, nombre_norm):
+        """Aplica las tres fases (exacto → parcial → fuzzy) a un nombre ya normalizado"""
+        return (
+            self.buscar_codigo_exacto(nombre_norm)
+            or self.buscar_codigo_parcial(nombre_norm)
+            or self.buscar_codigo_fuzzy(nombre_norm)
+        )
+
+    def codificar(self, nombres):
+        """
+        Codifica una lista de nombres de insumos crudos
+
+        Args:
+            nombres (list): Nombres tal como vienen en los pedidos
+
+        Returns:
+            list: Código por nombre (None si no hubo coincidencia)
+        """
+        return [self.codificar_normalizado(normalizar_texto(n)) for n in nombres]
+
+def huella_archivos(*rutas):
+    """(mtime, tamaño) de cada archivo; cambia cuando el catálogo se actualiza"""
+    huella = []
+    for ruta in rutas:
+        info = os.stat(ruta)
+        huella.append((info.st_mtime_ns, info.st_size))
+    return tuple(huella)
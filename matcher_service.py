@@ -0,0 +1,239 @@
+"""
+Servicio de Codificación de Insumos
+Autor: Data Team
+Descripción: Proceso local de larga duración que mantiene en memoria el
+             catálogo normalizado (Insumos Medicos + Maestro Medicamentos) y
+             responde solicitudes de codificación por HTTP en localhost. El
+             catálogo se recarga solo cuando cambian los archivos fuente.
+
+Uso:
+    python matcher_service.py --insumos "data/Insumos Medicos.csv" \\
+                              --maestro "data/Maestro Medicamentos.csv"
+
+    # En otra terminal, el script de pedidos usa el servicio con:
+    export MATCHER_URL=http://127.0.0.1:8765
+
+API:
+    POST /codificar   {"nombres": ["GASA 10X10", ...]}  →  {"codigos": ["123", null, ...]}
+    GET  /salud       estado del catálogo cargado
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from insumo_matcher import IndiceCatalogo, huella_archivos, UMBRAL_FUZZY
+
+# ===============================================================
+# CONFIGURACIÓN
+# ===============================================================
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+RUTA_INSUMOS = os.path.join(DATA_DIR, 'Insumos Medicos.csv')
+RUTA_MAESTRO = os.path.join(DATA_DIR, 'Maestro Medicamentos.csv')
+
+HOST = '127.0.0.1'
+PUERTO = 8765
+
+# Nombres por solicitud al usar el cliente
+NOMBRES_POR_SOLICITUD = 5000
+
+# ===============================================================
+# CATÁLOGO EN MEMORIA
+# ===============================================================
+class ServicioCatalogo:
+    """Mantiene el índice del catálogo y lo recarga si los archivos cambian"""
+
+    def __init__(self, ruta_insumos, ruta_maestro, umbral_fuzzy=UMBRAL_FUZZY):
+        self.ruta_insumos = ruta_insumos
+        self.ruta_maestro = ruta_maestro
+        self.umbral_fuzzy = umbral_fuzzy
+        self._lock = threading.Lock()
+        self._indice = None
+        self._huella = None
+        self._huella_fallida = None
+        self._error = None
+        self._error_avisado = None
+        self.cargado_en = None
+        self.recargas = 0
+        try:
+            self.obtener_indice()
+        except Exception as e:
+            # Se sigue escuchando: /codificar responde 500 hasta que el catálogo cargue
+            print(f"❌ Error cargando el catálogo: {e}")
+
+    def obtener_indice(self):
+        """
+        Retorna el índice vigente, recargándolo si el catálogo cambió en disco
+
+        Si la recarga falla (archivo a medio copiar, borrado, mal formado) se
+        sigue sirviendo el último índice válido; solo se propaga el error si
+        nunca se cargó uno. Una versión que ya falló no se reintenta hasta
+        que los archivos vuelvan a cambiar.
+        """
+        try:
+            huella = huella_archivos(self.ruta_insumos, self.ruta_maestro)
+        except OSError as e:
+            return self._ultimo_indice(e)
+        if huella == self._huella:
+            return self._indice
+        if huella == self._huella_fallida:
+            return self._ultimo_indice(self._error)
+
+        with self._lock:
+            if huella != self._huella:
+                inicio = time.perf_counter()
+                try:
+                    indice = IndiceCatalogo.desde_archivos(
+                        self.ruta_insumos, self.ruta_maestro, self.umbral_fuzzy
+                    )
+                except Exception as e:
+                    self._huella_fallida, self._error = huella, e
+                    return self._ultimo_indice(e)
+                self._indice = indice
+                self._huella = huella
+                self._huella_fallida, self._error = None, None
+                self.cargado_en = time.strftime('%Y-%m-%d %H:%M:%S')
+                self.recargas += 1
+                print(f"📚 Catálogo cargado: {len(self._indice):,} nombres "
+                      f"({time.perf_counter() - inicio:.2f}s)")
+            return self._indice
+
+    def _ultimo_indice(self, error):
+        """Último índice válido ante un error de recarga (lo propaga si no hay)"""
+        # Un aviso por error distinto (el servicio recibe miles de solicitudes)
+        if str(error) != self._error_avisado:
+            self._error_avisado = str(error)
+            if self._indice is not None:
+                print(f"⚠️  No se pudo recargar el catálogo ({error}); "
+                      f"se mantiene el cargado en {self.cargado_en}")
+        if self._indice is None:
+            raise error
+        return self._indice
+
+    def estado(self):
+        indice = self._indice
+        return {
+            'nombres_catalogo': len(indice) if indice else 0,
+            'cargado_en': self.cargado_en,
+            'recargas': self.recargas,
+            'error_recarga': str(self._error) if self._error else None
+        }
+
+# ===============================================================
+# SERVIDOR HTTP
+# ===============================================================
+class ManejadorMatcher(BaseHTTPRequestHandler):
+    """Atiende /codificar y /salud"""
+
+    servicio = None
+
+    def _responder(self, codigo, cuerpo):
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode('utf-8')
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_GET(self):
+        if self.path == '/salud':
+            self._responder(200, self.servicio.estado())
+        else:
+            self._responder(404, {'error': f'Ruta no encontrada: {self.path}'})
+
+    def do_POST(self):
+        if self.path != '/codificar':
+            self._responder(404, {'error': f'Ruta no encontrada: {self.path}'})
+            return
+        try:
+            largo = int(self.headers.get('Content-Length', 0))
+            nombres = json.loads(self.rfile.read(largo))['nombres']
+        except (ValueError, KeyError, TypeError) as e:
+            self._responder(400, {'error': f'Solicitud inválida: {e}'})
+            return
+        if not isinstance(nombres, list) or not all(n is None or isinstance(n, str) for n in nombres):
+            self._responder(400, {'error': "Solicitud inválida: 'nombres' debe ser una lista de textos"})
+            return
+
+        try:
+            indice = self.servicio.obtener_indice()
+        except Exception as e:
+            self._responder(500, {'error': f'Catálogo no disponible: {e}'})
+            return
+        self._responder(200, {'codigos': indice.codificar(nombres)})
+
+    def log_message(self, formato, *args):
+        # Sin log por solicitud; el servicio puede recibir miles por minuto
+        pass
+
+def iniciar_servicio(ruta_insumos, ruta_maestro, host=HOST, puerto=PUERTO, umbral_fuzzy=UMBRAL_FUZZY):
+    """
+    Carga el catálogo y atiende solicitudes hasta Ctrl+C
+
+    Args:
+        ruta_insumos (str): Ruta a Insumos Medicos.csv
+        ruta_maestro (str): Ruta a Maestro Medicamentos.csv
+        host (str): Interfaz de escucha (solo local por defecto)
+        puerto (int): Puerto HTTP
+        umbral_fuzzy (int): Umbral de similitud para la fase fuzzy
+    """
+    ManejadorMatcher.servicio = ServicioCatalogo(ruta_insumos, ruta_maestro, umbral_fuzzy)
+    servidor = ThreadingHTTPServer((host, puerto), ManejadorMatcher)
+    print(f"🚀 Servicio de codificación escuchando en http://{host}:{puerto}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\n\n⚠️  Servicio detenido por el usuario")
+    finally:
+        servidor.server_close()
+
+# ===============================================================
+# CLIENTE
+# ===============================================================
+def codificar_remoto(nombres, url, lote=NOMBRES_POR_SOLICITUD, timeout=300):
+    """
+    Codifica nombres de insumos usando un servicio ya iniciado
+
+    Args:
+        nombres (list): Nombres crudos de insumos
+        url (str): URL base del servicio (ej. http://127.0.0.1:8765)
+        lote (int): Nombres por solicitud
+        timeout (int): Segundos máximos por solicitud
+
+    Returns:
+        list: Código por nombre (None si no hubo coincidencia)
+    """
+    codigos = []
+    for i in range(0, len(nombres), lote):
+        bloque = [n if isinstance(n, str) else None for n in nombres[i:i + lote]]
+        solicitud = urllib.request.Request(
+            url.rstrip('/') + '/codificar',
+            data=json.dumps({'nombres': bloque}).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}
+        )
+        with urllib.request.urlopen(solicitud, timeout=timeout) as respuesta:
+            codigos.extend(json.loads(respuesta.read())['codigos'])
+    return codigos
+
+# ===============================================================
+# EJECUCIÓN
+# ===============================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servicio local de codificación de insumos")
+    parser.add_argument('--insumos', default=RUTA_INSUMOS, help="Ruta a Insumos Medicos.csv")
+    parser.add_argument('--maestro', default=RUTA_MAESTRO, help="Ruta a Maestro Medicamentos.csv")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--puerto', type=int, default=PUERTO)
+    parser.add_argument('--umbral', type=int, default=UMBRAL_FUZZY, help="Umbral fuzzy (0-100)")
+    args = parser.parse_args()
+
+    for ruta in [args.insumos, args.maestro]:
+        if not os.path.exists(ruta):
+            print(f"❌ Error: No se encontró el archivo {ruta}")
+            sys.exit(1)
+
+    iniciar_servicio(args.insumos, args.maestro, args.host, args.puerto, args.umbral)